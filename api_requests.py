@@ -1,10 +1,70 @@
 """To hangle api calls
 
 """
+import datetime
 import json
 import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from json_backend import loads
+from metrics import Metrics
+from record_store import RecordStore
+from request_scheduler import DEFAULT_RETRY_AFTER, RequestScheduler
+from singleflight import SingleFlight
+
+# Connection pool settings per host
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+# Retry settings for transient failures
+RETRY_TOTAL = 5
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_BACKOFF_MAX = 30
+# 429 is not retried by transport - it is handled by RequestScheduler
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+RATE_LIMIT_RETRIES = 5
+HTTP_TOO_MANY_REQUESTS = 429
+REQUEST_TIMEOUT = 10
+# Bytes read at once from streamed responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+urllib3.disable_warnings()
+
+
+class JitteredRetry(Retry):
+    """Retry policy with random jitter added to exponential backoff"""
+
+    def get_backoff_time(self) -> float:
+        """Randomize backoff time so parallel clients do not retry in lockstep
+
+        Returns:
+            float: Number of seconds to sleep before next retry
+        """
+        backoff = min(super().get_backoff_time(), RETRY_BACKOFF_MAX)
+        return random.uniform(backoff / 2, backoff) if backoff else 0
+
+    def is_retry(
+        self, method: str, status_code: int, has_retry_after: bool = False
+    ) -> bool:
+        """Leave 429 responses to RequestScheduler - transport would retry them on its own
+
+        Args:
+            method (str): HTTP method
+            status_code (int): Response status
+            has_retry_after (bool): Response has Retry-After header
+
+        Returns:
+            bool: True if transport should retry the request
+        """
+        if status_code == HTTP_TOO_MANY_REQUESTS:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
 
 
 class ApiRequests:
@@ -17,9 +77,77 @@ class ApiRequests:
         json: response in json format
     """
 
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+    # Host -> base url used instead, e.g. {"api.open-meteo.com": "http://127.0.0.1:8080"}
+    host_overrides = {}
+    # Identical requests running at the same time are sent only once
+    flight = SingleFlight()
+    # Store of recorded responses, None - responses are not recorded
+    records: RecordStore = None
+
+    @staticmethod
+    def _resolve_url(url: str) -> str:
+        """Redirect url to overridden host - used to run against local stand-in servers
+
+        Args:
+            url (str): Url for api call
+
+        Returns:
+            str: Url with scheme and host replaced if host is overridden
+        """
+        parts = urlsplit(url)
+        base_url = ApiRequests.host_overrides.get(parts.netloc)
+        if base_url is None:
+            return url
+        return base_url.rstrip("/") + url[len(f"{parts.scheme}://{parts.netloc}") :]
+
+    @staticmethod
+    def _build_session() -> requests.Session:
+        """Build keep-alive session with connection pool and retry policy
+
+        Returns:
+            requests.Session: Configured session
+        """
+        retry = JitteredRetry(
+            total=RETRY_TOTAL,
+            backoff_factor=RETRY_BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.verify = False
+        session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        return session
+
+    @staticmethod
+    def get_session(url: str) -> requests.Session:
+        """Get shared session for url host - connections are reused between calls
+
+        Args:
+            url (str): Url for api call
+
+        Returns:
+            requests.Session: Session assigned to the host
+        """
+        host = urlsplit(url).netloc
+        with ApiRequests._sessions_lock:
+            session = ApiRequests._sessions.get(host)
+            if session is None:
+                session = ApiRequests._build_session()
+                ApiRequests._sessions[host] = session
+            return session
+
     @staticmethod
     def api_get_request(url: str) -> json:
-        """_summary_
+        """Send GET request - identical requests in flight at the same time share one call
 
         Args:
             url (str): Url for api call
@@ -28,24 +156,203 @@ class ApiRequests:
             SystemExit: Could not decode the text into json, Error: A Connection error occurred.
 
         Returns:
-            json: api response in json format
+            json: api response in json format, shared between coalesced callers
+        """
+        return ApiRequests.flight.do(url, ApiRequests._send_get_request, url)
+
+    @staticmethod
+    def api_get_stream(url: str, decoder) -> tuple:
+        """Send GET request and decode response body chunk by chunk while it is received
+
+        Args:
+            url (str): Url for api call
+            decoder (HourlyStreamDecoder): Decoder fed with body chunks
+
+        Returns:
+            tuple: Result of decoder, api error in json format or False for known request errors
         """
+        return ApiRequests.flight.do(
+            f"stream:{url}", ApiRequests._send_get_request, url, decoder
+        )
+
+    @staticmethod
+    def _send_get_request(url: str, decoder=None) -> json:
+        """Send GET request with shared session when host rate limit allows it,
+        retry after 429 responses and record metrics
+
+        Args:
+            url (str): Url for api call
+            decoder (HourlyStreamDecoder): Decoder of streamed body, whole body is decoded if None
+
+        Returns:
+            json: api response in json format, False for known request errors
+        """
+        records = ApiRequests.records
+        if records is not None and records.replay:
+            return ApiRequests._replay(url, decoder)
+        record_url = url
+        endpoint = ApiRequests._endpoint_name(url)
+        host = urlsplit(url).netloc
+        url = ApiRequests._resolve_url(url)
+        start = time.perf_counter()
+        retries = 0
+        error_name = None
         try:
-            urllib3.disable_warnings()
-            api_request = requests.get(url=url, verify=False, timeout=10)
-            return api_request.json()
-        except requests.exceptions.TooManyRedirects:
-            logging.info("Error: Too many redirects.")
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                waited = RequestScheduler.acquire(host)
+                Metrics.increment("scheduler.wait_ms", round(waited * 1000))
+                api_request = ApiRequests.get_session(url).get(
+                    url=url, timeout=REQUEST_TIMEOUT, stream=decoder is not None
+                )
+                retries += ApiRequests._count_retries(api_request)
+                if api_request.status_code != HTTP_TOO_MANY_REQUESTS:
+                    RequestScheduler.bucket(host).recover()
+                    break
+                api_request.close()
+                RequestScheduler.bucket(host).throttle(
+                    ApiRequests._retry_after(api_request)
+                )
+                if attempt < RATE_LIMIT_RETRIES:
+                    retries += 1
+            if not api_request.ok:
+                error_name = f"HTTP {api_request.status_code}"
+            if api_request.status_code == HTTP_TOO_MANY_REQUESTS:
+                # Rate limit did not recover - closed response has no body to return
+                logging.info("Error: Too many requests.")
+                return False
+            if decoder is None:
+                response = api_request.json()
+                if records is not None and api_request.ok:
+                    records.put(
+                        record_url,
+                        api_request.status_code,
+                        api_request.content.decode("utf-8"),
+                    )
+                return response
+            if not api_request.ok:
+                return loads(api_request.content)
+            if records is None:
+                for chunk in api_request.iter_content(STREAM_CHUNK_SIZE):
+                    decoder.feed(chunk)
+                return decoder.result()
+            # Body is written to the record file while it is received
+            with records.writer(record_url, api_request.status_code) as writer:
+                for chunk in api_request.iter_content(STREAM_CHUNK_SIZE):
+                    decoder.feed(chunk)
+                    writer.write(chunk)
+                result = decoder.result()
+                writer.commit()
+            return result
+        except requests.exceptions.RequestException as error:
+            error_name = type(error).__name__
+            return ApiRequests._handle_request_error(error)
+        except ValueError as error:
+            # Streamed body which could not be decoded
+            error_name = type(error).__name__
+            logging.info("Error: Could not decode the text into json - %s", error)
             return False
-        except requests.exceptions.JSONDecodeError:
-            logging.info("Error: Could not decode the text into json")
+        finally:
+            Metrics.record_request(
+                endpoint, time.perf_counter() - start, retries, error_name
+            )
+
+    @staticmethod
+    def _replay(url: str, decoder=None) -> json:
+        """Serve recorded response instead of calling API
+
+        Args:
+            url (str): Url for api call
+            decoder (HourlyStreamDecoder): Decoder of body, body is decoded as json if None
+
+        Returns:
+            json: Recorded response, False if url was not recorded
+        """
+        body = ApiRequests.records.get(url)
+        if body is None:
+            logging.info("Error: No recorded response for %s", url)
             return False
-        except requests.exceptions.ConnectionError:
-            logging.info("Error: A Connection error occurred.")
+        if decoder is None:
+            return loads(body)
+        try:
+            decoder.feed(body.encode("utf-8"))
+            return decoder.result()
+        except ValueError as error:
+            logging.info("Error: Could not decode the text into json - %s", error)
             return False
-        except requests.exceptions.InvalidURL:
+
+    @staticmethod
+    def _handle_request_error(error: requests.exceptions.RequestException) -> bool:
+        """Log request error
+
+        Args:
+            error (requests.exceptions.RequestException): Raised error
+
+        Raises:
+            SystemExit: Error other than known transient ones
+
+        Returns:
+            bool: False for known errors
+        """
+        if isinstance(error, requests.exceptions.TooManyRedirects):
+            logging.info("Error: Too many redirects.")
+        elif isinstance(error, requests.exceptions.JSONDecodeError):
+            logging.info("Error: Could not decode the text into json")
+        elif isinstance(error, requests.exceptions.ConnectionError):
+            logging.info("Error: A Connection error occurred.")
+        elif isinstance(error, requests.exceptions.Timeout):
+            logging.info("Error: The request timed out.")
+        elif isinstance(error, requests.exceptions.InvalidURL):
             logging.info("Error: The URL provided was somehow invalid.")
-            return False
-        except requests.exceptions.RequestException as error:
+        else:
             logging.info("Fatal error: App will be closed")
             raise SystemExit(error) from error
+        return False
+
+    @staticmethod
+    def _endpoint_name(url: str) -> str:
+        """Name of the endpoint used in metrics
+
+        Args:
+            url (str): Url for api call
+
+        Returns:
+            str: Host and path of url
+        """
+        parts = urlsplit(url)
+        return f"{parts.netloc}{parts.path}"
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> float:
+        """Seconds to wait given by Retry-After header - number or HTTP date
+
+        Args:
+            response (requests.Response): 429 response
+
+        Returns:
+            float: Seconds to wait, at most RETRY_BACKOFF_MAX
+        """
+        value = response.headers.get("Retry-After", "")
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = (
+                    parsedate_to_datetime(value)
+                    - datetime.datetime.now(datetime.timezone.utc)
+                ).total_seconds()
+            except (TypeError, ValueError):
+                seconds = DEFAULT_RETRY_AFTER
+        return min(max(seconds, 0.0), RETRY_BACKOFF_MAX)
+
+    @staticmethod
+    def _count_retries(response: requests.Response) -> int:
+        """Number of retries done by transport before the response
+
+        Args:
+            response (requests.Response): Final response
+
+        Returns:
+            int: Number of retries
+        """
+        retry = getattr(response.raw, "retries", None)
+        return len(retry.history) if retry is not None else 0
@@ -0,0 +1,158 @@
+"""To handle decoding of large hourly API responses
+
+Response body is read in chunks and "hourly" arrays are parsed straight into
+preallocated numpy buffers, so no Python list of strings or floats is created.
+Hourly timestamps are regular, so only the first and the last one are parsed.
+"""
+import re
+import numpy as np
+
+HOUR = np.timedelta64(1, "h")
+# Bytes kept between chunks while searching for array keys
+KEY_SEARCH_TAIL = 64
+HOURLY_OBJECT = re.compile(rb'"hourly"\s*:\s*\{')
+
+
+class HourlyStreamDecoder:
+    """Incremental decoder of "hourly" arrays of Open-Meteo response
+
+    Args:
+        variables (list): Hourly variables to decode
+        expected_length (int): Expected number of hours - size of preallocated buffers
+    """
+
+    def __init__(self, variables: list, expected_length: int = 0):
+        self.variables = list(variables)
+        self.length = None
+        self.first_time = None
+        self.last_time = None
+        self._buffers = {
+            variable: np.empty(expected_length, dtype=np.float32)
+            for variable in self.variables
+        }
+        self._filled = dict.fromkeys(self.variables, 0)
+        self._keys = {
+            name: re.compile(rb'"%s"\s*:\s*\[' % re.escape(name.encode()))
+            for name in ["time", *self.variables]
+        }
+        self._pending = b""
+        self._in_hourly = False
+        self._array = None
+        self._time_count = 0
+
+    def feed(self, chunk: bytes):
+        """Decode next part of response body
+
+        Args:
+            chunk (bytes): Next bytes of the body
+        """
+        self._pending += chunk
+        while self._pending:
+            if self._array is None and not self._find_array():
+                return
+            if self._array is not None and not self._read_array():
+                return
+
+    def _find_array(self) -> bool:
+        """Move to the next wanted array inside "hourly" object
+
+        Returns:
+            bool: True if array start was found in pending bytes
+        """
+        if not self._in_hourly:
+            match = HOURLY_OBJECT.search(self._pending)
+            if match is None:
+                self._pending = self._pending[-KEY_SEARCH_TAIL:]
+                return False
+            self._in_hourly = True
+            self._pending = self._pending[match.end() :]
+        found = [
+            (match.start(), match.end(), name)
+            for name, key in self._keys.items()
+            if (match := key.search(self._pending)) is not None
+        ]
+        if not found:
+            self._pending = self._pending[-KEY_SEARCH_TAIL:]
+            return False
+        _, end, self._array = min(found)
+        del self._keys[self._array]
+        self._pending = self._pending[end:]
+        return True
+
+    def _read_array(self) -> bool:
+        """Decode complete elements of current array from pending bytes
+
+        Returns:
+            bool: True if the array was closed
+        """
+        end = self._pending.find(b"]")
+        closed = end >= 0
+        if not closed:
+            end = self._pending.rfind(b",")
+            if end < 0:
+                return False
+        part, self._pending = self._pending[:end], self._pending[end + 1 :]
+        if self._array == "time":
+            self._read_times(part, closed)
+        else:
+            self._read_values(part)
+        if closed:
+            self._array = None
+        return closed
+
+    def _read_times(self, part: bytes, closed: bool):
+        """Count timestamps and keep the first and the last one"""
+        if not part:
+            return
+        elements = part.count(b",") + 1
+        if self.first_time is None:
+            self.first_time = part[: part.find(b",")] if elements > 1 else part
+        self._time_count += elements
+        if closed:
+            self.last_time = part[part.rfind(b",") + 1 :]
+            self.length = self._time_count
+            for variable, buffer in self._buffers.items():
+                if len(buffer) < self.length:
+                    self._buffers[variable] = np.resize(buffer, self.length)
+
+    def _read_values(self, part: bytes):
+        """Parse numbers into the buffer of current variable"""
+        values = np.fromstring(
+            part.replace(b"null", b"nan").decode("ascii"), dtype=np.float32, sep=","
+        )
+        variable = self._array
+        buffer = self._buffers[variable]
+        filled = self._filled[variable]
+        if filled + len(values) > len(buffer):
+            # Values came before timestamps or expected length was too small
+            buffer = self._buffers[variable] = np.resize(
+                buffer, max(2 * len(buffer), filled + len(values))
+            )
+        buffer[filled : filled + len(values)] = values
+        self._filled[variable] = filled + len(values)
+
+    def result(self) -> tuple:
+        """Decoded arrays
+
+        Raises:
+            ValueError: Response has no complete hourly arrays
+
+        Returns:
+            tuple: (times as datetime64[h] array, {variable: float32 array})
+        """
+        if self.length is None or self._keys:
+            raise ValueError("Response has no complete hourly arrays")
+        if self.length == 0:
+            return np.array([], dtype="datetime64[h]"), {
+                variable: np.array([], dtype=np.float32) for variable in self.variables
+            }
+        start = np.datetime64(self.first_time.strip(b' "').decode(), "h")
+        times = start + np.arange(self.length) * HOUR
+        if times[-1] != np.datetime64(self.last_time.strip(b' "').decode(), "h"):
+            raise ValueError("Hourly timestamps are not regular")
+        values = {}
+        for variable in self.variables:
+            if self._filled[variable] != self.length:
+                raise ValueError(f"Hourly {variable} has wrong number of values")
+            values[variable] = self._buffers[variable][: self.length]
+        return times, values
@@ -0,0 +1,148 @@
+"""Headless batch mode - enrich route files with forecasts without GUI
+
+Route file is read in chunks and enriched rows are streamed to the output file,
+so memory use does not grow with route length. Run from cron, e.g.:
+
+    python batch.py route_data.csv route_forecast.jsonl --chunk-size 5000
+"""
+import argparse
+import logging
+import os
+import pandas as pd
+from api_requests import ApiRequests
+from logging_settings import set_logger
+from metrics import Metrics
+from record_store import RECORD_MODES, RecordStore
+from trip_pipeline import TripPipeline, MAX_WORKERS
+
+CHUNK_SIZE = 1000
+OUTPUT_FORMATS = ("csv", "jsonl", "parquet")
+
+
+class BatchWriter:
+    """Append dataframe chunks to CSV, JSON lines or Parquet file"""
+
+    def __init__(self, output_file: str, output_format: str):
+        self.output_file = output_file
+        self.output_format = output_format
+        self._parquet_writer = None
+        self._header_written = False
+        if os.path.exists(output_file):
+            os.remove(output_file)
+
+    def write(self, chunk: pd.DataFrame):
+        """Append one chunk to the output file
+
+        Args:
+            chunk (pd.DataFrame): Enriched trip rows
+        """
+        if self.output_format == "csv":
+            chunk.to_csv(
+                self.output_file, mode="a", header=not self._header_written, index=False
+            )
+            self._header_written = True
+        elif self.output_format == "jsonl":
+            with open(self.output_file, "a", encoding="utf-8") as file:
+                records = chunk.to_json(
+                    orient="records", lines=True, double_precision=6
+                )
+                file.write(records.rstrip("\n") + "\n")
+        else:
+            self._write_parquet(chunk)
+
+    def _write_parquet(self, chunk: pd.DataFrame):
+        """Append chunk as Parquet row group - requires pyarrow
+
+        Args:
+            chunk (pd.DataFrame): Enriched trip rows
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise SystemExit(
+                "Error: Parquet output requires pyarrow package"
+            ) from error
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.output_file, table.schema)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        """Finish writing the output file"""
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def run_batch(
+    route_file: str,
+    output_file: str,
+    output_format: str = None,
+    chunk_size: int = CHUNK_SIZE,
+    max_workers: int = MAX_WORKERS,
+) -> int:
+    """Enrich route file with forecasts chunk by chunk
+
+    Args:
+        route_file (str): CSV file with City, Street and Date columns
+        output_file (str): Path of the output file
+        output_format (str): One of OUTPUT_FORMATS, taken from output file extension if None
+        chunk_size (int): Number of rows processed at once
+        max_workers (int): Number of parallel requests
+
+    Returns:
+        int: Number of written rows
+    """
+    output_format = output_format or os.path.splitext(output_file)[1].lstrip(".")
+    if output_format not in OUTPUT_FORMATS:
+        raise SystemExit(f"Error: Output format must be one of {OUTPUT_FORMATS}")
+
+    pipeline = TripPipeline(max_workers)
+    writer = BatchWriter(output_file, output_format)
+    rows = 0
+    try:
+        for chunk in pd.read_csv(route_file, chunksize=chunk_size):
+            writer.write(pipeline.enrich(chunk))
+            rows += len(chunk)
+            logging.info("INFO: %s rows written to %s", rows, output_file)
+    finally:
+        writer.close()
+    return rows
+
+
+def main(argv: list = None):
+    """Parse command line arguments and run batch"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("route_file", help="CSV file with City, Street, Date columns")
+    parser.add_argument("output_file", help="Output .csv, .jsonl or .parquet file")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, dest="output_format")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--log-json", action="store_true", help="JSON lines log file")
+    parser.add_argument(
+        "--records",
+        choices=RECORD_MODES,
+        help="Record API responses or replay recorded ones without network",
+    )
+    args = parser.parse_args(argv)
+
+    set_logger(json_lines=args.log_json or None)
+    if args.records:
+        ApiRequests.records = RecordStore(mode=args.records)
+    Metrics.start_profiling()
+    try:
+        rows = run_batch(
+            args.route_file,
+            args.output_file,
+            args.output_format,
+            args.chunk_size,
+            args.max_workers,
+        )
+        logging.info("INFO: Batch finished - %s rows enriched", rows)
+    finally:
+        # Metrics of failed run show how far it got
+        Metrics.dump()
+
+
+if __name__ == "__main__":
+    main()
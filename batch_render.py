@@ -0,0 +1,229 @@
+"""Headless batch rendering of forecast charts and trip maps
+
+Forecasts are fetched in the main process, so caches, rate limits and coalescing
+of requests are shared. Charts (matplotlib Agg) and maps (folium HTML) are
+rendered in a process pool as soon as their data arrives. Run e.g. nightly:
+
+    python batch_render.py --locations locations.csv --routes route_data.csv
+        --output-dir renders --years 4
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import pandas as pd
+from api_requests import ApiRequests
+from forecast import ArchiveUnavailableError, ForecastUnavailableError
+from localization import CityLocalization
+from logging_settings import set_logger
+from metrics import Metrics
+from record_store import RECORD_MODES, RecordStore
+from trip_pipeline import TripPipeline, MAX_WORKERS
+
+RENDER_DIR = "renders"
+FORECAST_DAYS = "5"
+CHART_DPI = 100
+
+
+def output_name(*parts: str) -> str:
+    """File name safe on every system
+
+    Args:
+        *parts (str): Parts of the name
+
+    Returns:
+        str: Parts joined with "_" and reduced to letters, digits, "-" and "_"
+    """
+    return "_".join(re.sub(r"[^\w-]+", "-", str(part)).strip("-") for part in parts)
+
+
+def _init_worker():
+    """Select non-interactive matplotlib backend in every worker process"""
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def render_chart(path: str, title: str, forecast, bands=None) -> str:
+    """Render forecast chart as PNG - runs in worker process
+
+    Args:
+        path (str): Output file
+        title (str): City shown in chart title
+        forecast (TimeSeriesBlock): Forecast series
+        bands (TimeSeriesBlock): Climatology bands drawn under forecast, skipped if None
+
+    Returns:
+        str: Output file
+    """
+    import matplotlib.pyplot as plt
+    from main import plot_climatology_bands, plot_time_series, set_plot_paramerers
+
+    figure, ax = plt.subplots()
+    if bands is not None:
+        plot_climatology_bands(ax, bands, forecast.times)
+    plot_time_series(ax, forecast)
+    set_plot_paramerers(title, str(len(forecast) // 24))
+    figure.savefig(path, dpi=CHART_DPI, bbox_inches="tight")
+    plt.close(figure)
+    return path
+
+
+def render_map(path: str, trip_data: pd.DataFrame) -> str:
+    """Render trip map as standalone HTML - runs in worker process
+
+    Args:
+        path (str): Output file
+        trip_data (pd.DataFrame): Trip details enriched by TripPipeline
+
+    Returns:
+        str: Output file
+    """
+    from trip_map import build_trip_map, render_html
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(render_html(build_trip_map(trip_data)))
+    return path
+
+
+def fetch_location(city: str, street: str, days: str, years: int) -> tuple:
+    """Fetch data of one location chart - runs in fetch thread
+
+    Args:
+        city (str): City name
+        street (str): Street name
+        days (str): Number of forecast days
+        years (int): Number of years of climatology, plain forecast chart if 0
+
+    Returns:
+        tuple: (forecast, bands) - bands is None for plain forecast chart
+    """
+    import main
+
+    coords_dict = CityLocalization(city, street).get_coordinates_from_response()
+    if not years:
+        return main.build_forecast_time_series(days, coords_dict), None
+    forecast, bands, _ = main.build_climatology_comparison(days, coords_dict, years)
+    return forecast, bands
+
+
+def run_batch_render(
+    locations: list,
+    routes: list,
+    output_dir: str = RENDER_DIR,
+    days: str = FORECAST_DAYS,
+    years: int = 0,
+    processes: int = None,
+    max_workers: int = MAX_WORKERS,
+) -> list:
+    """Fetch data and render charts and maps in parallel
+
+    Args:
+        locations (list): List of tuples (city, street) - one chart each
+        routes (list): Route CSV files - one map each
+        output_dir (str): Directory of rendered files
+        days (str): Number of forecast days of charts
+        years (int): Years of climatology drawn on charts, 0 - plain forecast charts
+        processes (int): Number of render processes, number of CPUs if None
+        max_workers (int): Number of parallel requests
+
+    Returns:
+        list: Paths of rendered files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    kind = "climatology" if years else "forecast"
+    rendered, failed = [], 0
+    # Spawned workers do not inherit locks held by fetch threads
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as render_pool, ThreadPoolExecutor(max_workers=max_workers) as fetch_pool:
+        fetches = {
+            fetch_pool.submit(fetch_location, city, street, days, years): (city, street)
+            for city, street in locations
+        }
+        renders = []
+        # Maps are rendered while location data is still being fetched
+        for route_file in routes:
+            with Metrics.stage("render.route_fetch"):
+                trip_data = TripPipeline(max_workers).enrich(pd.read_csv(route_file))
+            name = output_name(
+                "trip", os.path.splitext(os.path.basename(route_file))[0]
+            )
+            renders.append(
+                render_pool.submit(
+                    render_map, os.path.join(output_dir, f"{name}.html"), trip_data
+                )
+            )
+        for future in as_completed(fetches):
+            city, street = fetches[future]
+            try:
+                forecast, bands = future.result()
+            except (
+                SystemExit,
+                ForecastUnavailableError,
+                ArchiveUnavailableError,
+            ) as error:
+                failed += 1
+                logging.info("Error: No data for %s, %s - %s", city, street, error)
+                continue
+            path = os.path.join(output_dir, f"{output_name(kind, city, street)}.png")
+            renders.append(
+                render_pool.submit(render_chart, path, city, forecast, bands)
+            )
+        for future in as_completed(renders):
+            rendered.append(future.result())
+    Metrics.increment("render.files", len(rendered))
+    Metrics.increment("render.failed", failed)
+    return rendered
+
+
+def main(argv: list = None):
+    """Parse command line arguments and render all charts and maps"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", help="CSV file with City, Street columns")
+    parser.add_argument("--routes", nargs="*", default=[], help="Route CSV files")
+    parser.add_argument("--output-dir", default=RENDER_DIR)
+    parser.add_argument("--days", default=FORECAST_DAYS)
+    parser.add_argument(
+        "--years", type=int, default=0, help="Years of climatology on charts"
+    )
+    parser.add_argument("--processes", type=int, help="Render processes, CPUs if empty")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--records", choices=RECORD_MODES)
+    args = parser.parse_args(argv)
+
+    set_logger()
+    if args.records:
+        ApiRequests.records = RecordStore(mode=args.records)
+    locations = []
+    if args.locations:
+        location_data = pd.read_csv(args.locations)
+        locations = list(
+            dict.fromkeys(zip(location_data["City"], location_data["Street"]))
+        )
+    start = time.perf_counter()
+    rendered = run_batch_render(
+        locations,
+        args.routes,
+        args.output_dir,
+        args.days,
+        args.years,
+        args.processes,
+        args.max_workers,
+    )
+    logging.info(
+        "INFO: %s files rendered to %s in %.1f s",
+        len(rendered),
+        args.output_dir,
+        time.perf_counter() - start,
+    )
+    Metrics.dump()
+
+
+if __name__ == "__main__":
+    main()
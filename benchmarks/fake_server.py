@@ -0,0 +1,267 @@
+"""Local stand-in for geocode.maps.co and Open-Meteo forecast / archive APIs
+
+Serves deterministic payloads shaped like the real services, with configurable
+latency, error rate and rate limit. Can be run on its own:
+
+    python benchmarks/fake_server.py --port 8080 --latency 0.2
+"""
+import argparse
+import datetime
+import json
+import math
+import random
+import socket
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Hosts served by the stand-in
+SERVED_HOSTS = ("geocode.maps.co", "api.open-meteo.com", "archive-api.open-meteo.com")
+# WMO weather codes returned as integers by the real API
+WEATHER_CODES = (0, 1, 2, 3, 45, 51, 61, 63, 71, 80, 95)
+
+
+def _seed(*values) -> float:
+    """Deterministic number in range [0, 1) for given values"""
+    return zlib.crc32("|".join(map(str, values)).encode()) / 2**32
+
+
+def geocode_payload(city: str, street: str) -> list:
+    """Geocode response - places are spread over Poland"""
+    return [
+        {
+            "lat": f"{49.0 + 5.5 * _seed(city, street, 'lat'):.7f}",
+            "lon": f"{14.1 + 9.9 * _seed(city, street, 'lon'):.7f}",
+            "display_name": f"{street}, {city}, Polska",
+        }
+    ]
+
+
+def hourly_payload(
+    lat: float, lon: float, start: datetime.date, days: int, variables: list
+) -> dict:
+    """Forecast / archive response with hourly values"""
+    times = [
+        (
+            datetime.datetime.combine(start, datetime.time())
+            + datetime.timedelta(hours=hour)
+        )
+        for hour in range(days * 24)
+    ]
+    hourly = {"time": [moment.strftime("%Y-%m-%dT%H:%M") for moment in times]}
+    for variable in variables:
+        phase = _seed(lat, lon, variable) * 2 * math.pi
+        hourly[variable] = [
+            round(
+                10
+                + 8 * math.sin(2 * math.pi * moment.hour / 24 + phase)
+                + 10 * math.sin(2 * math.pi * moment.timetuple().tm_yday / 365),
+                1,
+            )
+            for moment in times
+        ]
+    return {"latitude": lat, "longitude": lon, "hourly": hourly}
+
+
+def daily_payload(
+    lat: float, lon: float, start: datetime.date, days: int, variables: list
+) -> dict:
+    """Forecast response with daily values"""
+    dates = [start + datetime.timedelta(days=day) for day in range(days)]
+    daily = {"time": [date.isoformat() for date in dates]}
+    for variable in variables:
+        if variable == "weathercode":
+            daily[variable] = [
+                WEATHER_CODES[int(len(WEATHER_CODES) * _seed(lat, lon, variable, date))]
+                for date in dates
+            ]
+            continue
+        daily[variable] = [
+            round(max(0.0, 20 * _seed(lat, lon, variable, date) - 5), 1)
+            for date in dates
+        ]
+    return {"latitude": lat, "longitude": lon, "daily": daily}
+
+
+class FakeServer:
+    """Threaded HTTP server with configurable latency, errors and rate limit"""
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit: float = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.counters = {"requests": 0, "errors": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base url of running server"""
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def host_overrides(self) -> dict:
+        """Mapping for ApiRequests.host_overrides redirecting all served hosts here"""
+        return {host: self.url for host in SERVED_HOSTS}
+
+    def start(self) -> "FakeServer":
+        """Serve requests in background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving requests"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _admit(self) -> str:
+        """Decide fate of incoming request
+
+        Returns:
+            str: "ok", "error" or "rate_limited"
+        """
+        with self._lock:
+            self.counters["requests"] += 1
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                if now - self._window_start >= 1:
+                    self._window_start, self._window_requests = now, 0
+                self._window_requests += 1
+                if self._window_requests > self.rate_limit:
+                    self.counters["rate_limited"] += 1
+                    return "rate_limited"
+            if random.random() < self.error_rate:
+                self.counters["errors"] += 1
+                return "error"
+        return "ok"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Routes requests to payload builders"""
+
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # Headers and body are written separately - avoid Nagle delays
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _send(self, status: int, payload, headers: dict = None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                time.sleep(
+                    max(0.0, server.latency + random.uniform(-1, 1) * server.jitter)
+                )
+                fate = server._admit()
+                if fate == "rate_limited":
+                    self._send(
+                        429,
+                        {"error": True, "reason": "Too many requests"},
+                        {"Retry-After": "1"},
+                    )
+                    return
+                if fate == "error":
+                    self._send(503, {"error": True, "reason": "Service unavailable"})
+                    return
+                parts = urlsplit(self.path)
+                query = {
+                    name: values[0] for name, values in parse_qs(parts.query).items()
+                }
+                if parts.path == "/search":
+                    self._send(
+                        200,
+                        geocode_payload(query.get("city", ""), query.get("street", "")),
+                    )
+                    return
+                if parts.path not in ("/v1/forecast", "/v1/archive"):
+                    self._send(404, {"error": True, "reason": "Not found"})
+                    return
+                self._send(200, self._weather(query))
+
+            @staticmethod
+            def _weather(query: dict):
+                if "start_date" in query:
+                    start = datetime.date.fromisoformat(query["start_date"])
+                    days = (
+                        datetime.date.fromisoformat(query["end_date"]) - start
+                    ).days + 1
+                else:
+                    start = datetime.date.today()
+                    days = int(query.get("forecast_days", 7))
+                latitudes = [float(value) for value in query["latitude"].split(",")]
+                longitudes = [float(value) for value in query["longitude"].split(",")]
+                payloads = []
+                for lat, lon in zip(latitudes, longitudes):
+                    if "daily" in query:
+                        payloads.append(
+                            daily_payload(
+                                lat, lon, start, days, query["daily"].split(",")
+                            )
+                        )
+                    else:
+                        payloads.append(
+                            hourly_payload(
+                                lat, lon, start, days, query["hourly"].split(",")
+                            )
+                        )
+                return payloads[0] if len(payloads) == 1 else payloads
+
+        return Handler
+
+
+def main(argv: list = None):
+    """Run stand-in server in foreground"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    args = parser.parse_args(argv)
+    server = FakeServer(
+        args.port, args.latency, args.jitter, args.error_rate, args.rate_limit
+    )
+    print(f"Serving {', '.join(SERVED_HOSTS)} at {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
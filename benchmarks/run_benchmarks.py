@@ -0,0 +1,198 @@
+"""Scenario benchmarks against local stand-in of the weather services
+
+Every scenario runs with cold caches in a temporary directory and reports wall time
+and number of upstream calls. Results are appended as JSON lines, and compared with
+the previous run of the same scenario:
+
+    python benchmarks/run_benchmarks.py --latency 0.05 --sizes 10 100 1000
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# pylint: disable=wrong-import-position
+import pandas as pd
+from api_requests import ApiRequests
+from fake_server import SERVED_HOSTS, FakeServer
+from forecast import CityForecast
+from geocode_cache import GeocodeCache
+from localization import CityLocalization
+from request_scheduler import HOST_RATE_LIMITS
+from response_cache import ResponseCache
+
+RESULTS_FILE = os.path.join(REPO_DIR, "benchmarks", "results.jsonl")
+ROUTE_SIZES = (10, 100, 1000)
+COORDINATES = {"lat": 51.11, "lon": 17.03}
+# Requests per second of the stand-in when it runs without rate limit
+STAND_IN_RATE_LIMIT = 1000
+
+
+def reset_caches(directory: str):
+    """Point all caches to empty files in directory
+
+    Args:
+        directory (str): Temporary directory of the scenario
+    """
+    CityLocalization.cache = GeocodeCache(os.path.join(directory, "geocode.sqlite"))
+    CityForecast.cache = ResponseCache(os.path.join(directory, "responses.sqlite"))
+    os.chdir(directory)
+
+
+def build_route(size: int) -> pd.DataFrame:
+    """Synthetic route - places repeat like in real trips
+
+    Args:
+        size (int): Number of rows
+
+    Returns:
+        pd.DataFrame: Route with City, Street and Date columns
+    """
+    today = datetime.date.today()
+    return pd.DataFrame(
+        {
+            "City": [f"City{index % max(1, size // 3)}" for index in range(size)],
+            "Street": [f"Street{index % 7}" for index in range(size)],
+            "Date": [
+                (today + datetime.timedelta(days=index % 10)).isoformat()
+                for index in range(size)
+            ],
+        }
+    )
+
+
+def scenario_option_1():
+    """build_forecast_time_series for 16 forecast days"""
+    import main
+
+    main.build_forecast_time_series("16", COORDINATES)
+
+
+def scenario_option_2(years: int):
+    """build_climatology_comparison for number of years - index is built from archive"""
+    import main
+
+    main.build_climatology_comparison("5", COORDINATES, years)
+
+
+def scenario_option_3(size: int):
+    """TripPipeline.enrich for route of given size"""
+    from trip_pipeline import TripPipeline
+
+    TripPipeline().enrich(build_route(size))
+
+
+def run_scenario(name: str, function, server: FakeServer, repeat: int) -> dict:
+    """Run scenario with cold caches and collect timings
+
+    Args:
+        name (str): Scenario name
+        function (callable): Scenario without arguments
+        server (FakeServer): Running stand-in server
+        repeat (int): Number of runs
+
+    Returns:
+        dict: Scenario result
+    """
+    timings = []
+    upstream_calls = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            reset_caches(directory)
+            requests_before = server.counters["requests"]
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+            upstream_calls.append(server.counters["requests"] - requests_before)
+            os.chdir(REPO_DIR)
+    return {
+        "scenario": name,
+        "median_s": round(statistics.median(timings), 4),
+        "min_s": round(min(timings), 4),
+        "max_s": round(max(timings), 4),
+        "upstream_calls": max(upstream_calls),
+    }
+
+
+def previous_results(path: str) -> dict:
+    """Last recorded result of every scenario
+
+    Args:
+        path (str): JSON lines results file
+
+    Returns:
+        dict: {scenario: result}
+    """
+    results = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                result = json.loads(line)
+                results[result["scenario"]] = result
+    return results
+
+
+def main(argv: list = None):
+    """Run all scenarios and append results"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--sizes", type=int, nargs="+", default=ROUTE_SIZES)
+    parser.add_argument("--years", type=int, nargs="+", default=(5, 30))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=RESULTS_FILE)
+    args = parser.parse_args(argv)
+
+    scenarios = [("option_1", scenario_option_1)]
+    scenarios += [
+        (f"option_2_years_{years}", lambda years=years: scenario_option_2(years))
+        for years in args.years
+    ]
+    scenarios += [
+        (f"option_3_rows_{size}", lambda size=size: scenario_option_3(size))
+        for size in args.sizes
+    ]
+
+    previous = previous_results(args.output)
+    run_info = {
+        "run_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "rate_limit": args.rate_limit,
+    }
+    with FakeServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    ) as server:
+        ApiRequests.host_overrides = server.host_overrides()
+        # Scheduler follows limit of the stand-in, not limits of the real services
+        rate = args.rate_limit or STAND_IN_RATE_LIMIT
+        HOST_RATE_LIMITS.update(
+            {host: (rate, max(1, int(rate))) for host in SERVED_HOSTS}
+        )
+        with open(args.output, "a", encoding="utf-8") as results_file:
+            for name, function in scenarios:
+                result = dict(
+                    run_info, **run_scenario(name, function, server, args.repeat)
+                )
+                if name in previous:
+                    result["change"] = round(
+                        result["median_s"] / previous[name]["median_s"] - 1, 3
+                    )
+                results_file.write(json.dumps(result) + "\n")
+                print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Startup time benchmark - time to menu and import cost of every option
+
+Every measurement runs in a fresh interpreter, so module caches do not hide import cost.
+Results are printed as JSON:
+
+    python benchmarks/startup_benchmark.py --repeat 5
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_FILE = os.path.join(REPO_DIR, "main.py")
+OPTIONS = ("run_option_1", "run_option_2", "run_option_3", "run_option_4")
+# Modules imported lazily inside other modules when their functions run
+NESTED_IMPORTS = {"trip_map": ["folium"]}
+
+TIME_TO_MENU = """
+import logging, time
+start = time.perf_counter()
+import main
+logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+main.CliMenu.print_start_menu()
+print(time.perf_counter() - start)
+"""
+
+OPTION_IMPORT = """
+import importlib, time
+import main
+start = time.perf_counter()
+for module in {modules!r}:
+    importlib.import_module(module)
+print(time.perf_counter() - start)
+"""
+
+
+def option_imports(path: str = MAIN_FILE) -> dict:
+    """Modules imported lazily by every menu option - read from source of main module,
+    including imports of main module functions called by the option
+
+    Args:
+        path (str): Main module file
+
+    Returns:
+        dict: {option: sorted list of modules}
+    """
+    with open(path, encoding="utf-8") as file:
+        tree = ast.parse(file.read())
+    imports, calls = {}, {}
+    for function in tree.body:
+        if not isinstance(function, ast.FunctionDef):
+            continue
+        imports[function.name], calls[function.name] = set(), set()
+        for node in ast.walk(function):
+            if isinstance(node, ast.Import):
+                imports[function.name].update(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                imports[function.name].add(node.module)
+            elif isinstance(node, ast.Name):
+                # Called or passed on, e.g. to prefetch
+                calls[function.name].add(node.id)
+
+    result = {}
+    for option in OPTIONS:
+        modules, visited, pending = set(), set(), [option]
+        while pending:
+            name = pending.pop()
+            # Options return to the menu loop, which leads to every option
+            if name in visited or name not in imports or name == "app_run":
+                continue
+            visited.add(name)
+            modules |= imports[name]
+            for module in imports[name]:
+                modules.update(NESTED_IMPORTS.get(module, []))
+            pending.extend(calls[name])
+        result[option.replace("run_", "")] = sorted(modules)
+    return result
+
+
+def measure(code: str, repeat: int) -> dict:
+    """Run code in fresh interpreters and collect printed timings
+
+    Args:
+        code (str): Python code printing elapsed seconds as last line
+        repeat (int): Number of runs
+
+    Returns:
+        dict: Timing statistics in milliseconds or error message
+    """
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1]}
+        timings.append(float(result.stdout.strip().splitlines()[-1]) * 1000)
+    return {
+        "min_ms": round(min(timings), 2),
+        "median_ms": round(statistics.median(timings), 2),
+        "max_ms": round(max(timings), 2),
+    }
+
+
+def main(argv: list = None):
+    """Run all startup measurements and print results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = {"time_to_menu": measure(TIME_TO_MENU, args.repeat)}
+    for option, modules in option_imports().items():
+        results[f"{option}_imports"] = measure(
+            OPTION_IMPORT.format(modules=modules), args.repeat
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""To handle climatology statistics of historical data"""
+import warnings
+import numpy as np
+
+# Band label -> percentile
+PERCENTILES = {"min": 0, "p10": 10, "median": 50, "p90": 90, "max": 100}
+
+
+class Climatology:
+    """Percentile bands computed across years aligned by hour of the period"""
+
+    @staticmethod
+    def percentiles(values: np.ndarray, axis: int = 0) -> np.ndarray:
+        """Compute all PERCENTILES at once ignoring missing values
+
+        Args:
+            values (np.ndarray): Values with samples along axis
+            axis (int): Axis of samples, e.g. years
+
+        Returns:
+            np.ndarray: float32 array with PERCENTILES as the first axis
+        """
+        with warnings.catch_warnings():
+            # Hours missing in all years stay NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return np.nanpercentile(
+                values, list(PERCENTILES.values()), axis=axis
+            ).astype(np.float32)
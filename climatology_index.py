@@ -0,0 +1,250 @@
+"""To handle precomputed climatology index per archive grid cell
+
+Percentile bands for every day of year and hour of day are computed once from
+full archive years and saved as numpy file. Lookups read the file memory-mapped,
+so comparing forecast with climatology needs no network and no recomputation.
+Index can be built offline:
+
+    python climatology_index.py --city Wroclaw --street Fabryczna --years 30
+"""
+import argparse
+import datetime
+import logging
+import os
+import tempfile
+import threading
+import numpy as np
+from climatology import PERCENTILES, Climatology
+from forecast import ArchiveUnavailableError
+from grid_index import ARCHIVE_GRID
+from historical_store import HistoricalStore
+from singleflight import KeyedLocks
+from timeseries import TimeSeriesBlock
+
+CLIMATOLOGY_INDEX_DIR = "climatology_index"
+INDEX_YEARS = 30
+# Days before and after pooled with every day of year - smoother bands
+WINDOW_DAYS = 3
+DAYS_IN_LEAP_YEAR = 366
+FEBRUARY_29 = 59
+# Share of hours of every year which must have value - failed fetch is not saved
+MIN_YEAR_COVERAGE = 0.95
+# Only one thread builds index of the cell, others wait and use it
+INDEX_LOCKS = KeyedLocks()
+
+
+def is_leap(year: np.ndarray) -> np.ndarray:
+    """Leap year check of int array of years"""
+    return (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+
+
+def day_of_year(times: np.ndarray) -> tuple:
+    """Day of year in leap year calendar and hour of day
+
+    Args:
+        times (np.ndarray): datetime64[h] array
+
+    Returns:
+        tuple: (day of year 0-365, hour 0-23, year) int arrays
+    """
+    days = times.astype("datetime64[D]")
+    years = days.astype("datetime64[Y]")
+    year = years.astype(int) + 1970
+    doy = (days - years).astype(int)
+    leap = is_leap(year)
+    # Non leap years skip index of 29th of February
+    doy = np.where(~leap & (doy >= FEBRUARY_29), doy + 1, doy)
+    hour = (times - days).astype("timedelta64[h]").astype(int)
+    return doy, hour, year
+
+
+class ClimatologyIndex:
+    """Day of year x hour of day percentile bands stored per archive grid cell"""
+
+    def __init__(
+        self,
+        years: int = INDEX_YEARS,
+        directory: str = CLIMATOLOGY_INDEX_DIR,
+        store: HistoricalStore = None,
+        last_year: int = None,
+    ):
+        self.years = years
+        # Index of previous year is rebuilt after new year
+        self.last_year = last_year or datetime.date.today().year - 1
+        self.directory = directory
+        self.store = store or HistoricalStore()
+        self._opened = {}
+        self._lock = threading.Lock()
+
+    def _path(self, coords_dict: dict) -> str:
+        """Path of the index file for grid cell containing location
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+
+        Returns:
+            str: Path to numpy file
+        """
+        lat, lon = ARCHIVE_GRID.cell(coords_dict)
+        return os.path.join(
+            self.directory, f"{lat:.2f}_{lon:.2f}_{self.years}y_{self.last_year}.npy"
+        )
+
+    def build(self, coords_dict: dict) -> str:
+        """Compute bands from full archive years and save index file
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+
+        Raises:
+            ArchiveUnavailableError: Archive data of some year is missing
+
+        Returns:
+            str: Path to index file
+        """
+        last_year = self.last_year
+        first_year = last_year - self.years + 1
+        start = f"{first_year}-01-01"
+        times, values = self.store.get_ranges(
+            coords_dict, {start: f"{last_year}-12-31"}
+        )[start]
+
+        doy, hour, year = day_of_year(times)
+        samples = np.full((self.years, DAYS_IN_LEAP_YEAR, 24), np.nan, dtype=np.float32)
+        samples[year - first_year, doy, hour] = values
+        years = np.arange(first_year, last_year + 1)
+        hours_in_year = np.where(is_leap(years), DAYS_IN_LEAP_YEAR, 365) * 24
+        covered = np.count_nonzero(~np.isnan(samples), axis=(1, 2))
+        incomplete = years[covered < MIN_YEAR_COVERAGE * hours_in_year]
+        if incomplete.size:
+            raise ArchiveUnavailableError(
+                f"Archive data for {coords_dict} incomplete in years {incomplete.tolist()}"
+            )
+        # Pool neighbour days of every day of year, wrapping around new year
+        pooled = np.concatenate(
+            [
+                np.roll(samples, shift, axis=1)
+                for shift in range(-WINDOW_DAYS, WINDOW_DAYS + 1)
+            ]
+        )
+        bands = Climatology.percentiles(pooled)
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(coords_dict)
+        descriptor, temporary_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.save(file, bands)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+        with self._lock:
+            self._opened.pop(path, None)
+        logging.info(
+            "INFO: Climatology index for years %s-%s saved to %s \n",
+            first_year,
+            last_year,
+            path,
+        )
+        return path
+
+    def _open(self, coords_dict: dict) -> np.ndarray:
+        """Memory-map index file, building it first if it does not exist
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+
+        Returns:
+            np.ndarray: Read only (band, day of year, hour) array
+        """
+        path = self._path(coords_dict)
+        with self._lock:
+            bands = self._opened.get(path)
+        if bands is not None:
+            return bands
+        if not os.path.exists(path):
+            with INDEX_LOCKS.lock(path):
+                # Index may have been built while waiting for the lock
+                if not os.path.exists(path):
+                    self.build(coords_dict)
+        bands = np.load(path, mmap_mode="r")
+        with self._lock:
+            self._opened[path] = bands
+        return bands
+
+    def prepare(self, coords_dict: dict):
+        """Build index of location if it does not exist yet, e.g. in background
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+        """
+        self._open(coords_dict)
+
+    def lookup(self, coords_dict: dict, times: np.ndarray) -> TimeSeriesBlock:
+        """Climatology bands for given hours
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+            times (np.ndarray): Hourly datetime64 timestamps
+
+        Returns:
+            TimeSeriesBlock: One row per band - min, p10, median, p90, max
+        """
+        times = np.asarray(times, dtype="datetime64[h]")
+        doy, hour, _ = day_of_year(times)
+        bands = self._open(coords_dict)[:, doy, hour]
+        return TimeSeriesBlock(times[0], list(PERCENTILES), bands)
+
+    def percentile_rank(
+        self, coords_dict: dict, times: np.ndarray, values: np.ndarray
+    ) -> np.ndarray:
+        """How unusual values are - approximate percentile of every value in climatology
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+            times (np.ndarray): Hourly datetime64 timestamps
+            values (np.ndarray): Values to compare, e.g. temperature forecast
+
+        Returns:
+            np.ndarray: Percentile 0-100 for every value, interpolated between bands
+        """
+        bands = self.lookup(coords_dict, times).values
+        levels = np.array(list(PERCENTILES.values()), dtype=np.float32)
+        values = np.asarray(values, dtype=np.float32)
+        ranks = np.full(values.shape, np.nan, dtype=np.float32)
+        ranks[values <= bands[0]] = levels[0]
+        ranks[values >= bands[-1]] = levels[-1]
+        for lower in range(len(levels) - 1):
+            low, high = bands[lower], bands[lower + 1]
+            inside = (values > low) & (values < high)
+            fraction = (values - low) / np.where(high > low, high - low, 1)
+            ranks = np.where(
+                inside,
+                levels[lower] + fraction * (levels[lower + 1] - levels[lower]),
+                ranks,
+            )
+        return ranks
+
+
+def main(argv: list = None):
+    """Geocode location and build its climatology index"""
+    from localization import CityLocalization
+    from logging_settings import set_logger
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--city", default="Wroclaw")
+    parser.add_argument("--street", default="Fabryczna")
+    parser.add_argument("--years", type=int, default=INDEX_YEARS)
+    parser.add_argument("--last-year", type=int, help="previous year by default")
+    args = parser.parse_args(argv)
+
+    set_logger()
+    coords_dict = CityLocalization(
+        args.city, args.street
+    ).get_coordinates_from_response()
+    ClimatologyIndex(args.years, last_year=args.last_year).build(coords_dict)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 
 
 class ForecastTypes(Enum):
@@ -18,3 +18,13 @@ class Coordinates(Enum):
 
     LATITUDE = "lat"
     LONGITUDE = "lon"
+
+
+class RequestPriority(IntEnum):
+    """
+    Priorities of API requests - lower value is sent first
+    """
+
+    INTERACTIVE = 0
+    BATCH = 1
+    PREFETCH = 2
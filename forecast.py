@@ -1,17 +1,36 @@
 """To handle fetching different types of wheater
 """
+import datetime
 import json
 from api_requests import ApiRequests
+from grid_index import ARCHIVE_GRID, FORECAST_GRID
+from response_cache import ResponseCache
+
+
+class ForecastUnavailableError(RuntimeError):
+    """API did not return forecast data"""
+
+
+class ArchiveUnavailableError(RuntimeError):
+    """Archive API did not return complete historical data"""
 
 
 class CityForecast:
-    """Class for checking forecast for particular coordinates, number of days and type"""
+    """Class for checking forecast for particular coordinates, number of days and types.
+    All requested types are fetched with one API call"""
 
-    def __init__(self, coordinates: dict, days: str, forecast_type: str):
+    cache = ResponseCache()
+    # Coordinates are snapped to model grid, so locations in one cell share requests
+    grid = FORECAST_GRID
+
+    def __init__(self, coordinates: dict, days: str, forecast_types):
+        coordinates = self.grid.snap(coordinates)
         self.longitude = coordinates["lon"]
         self.latitude = coordinates["lat"]
         self.days = days
-        self.forecast_type = forecast_type
+        if isinstance(forecast_types, str):
+            forecast_types = [forecast_types]
+        self.forecast_types = list(dict.fromkeys(forecast_types))
 
     def _build_forecast_request_url(self) -> str:
         """API call url format
@@ -19,7 +38,8 @@ class CityForecast:
         Returns:
             str: URL in format ready to use in API call
         """
-        return f"https://api.open-meteo.com/v1/forecast?latitude={self.latitude}&longitude={self.longitude}&hourly={self.forecast_type}&forecast_days={self.days}"
+        hourly = ",".join(self.forecast_types)
+        return f"https://api.open-meteo.com/v1/forecast?latitude={self.latitude}&longitude={self.longitude}&hourly={hourly}&forecast_days={self.days}"
 
     def make_forecast_request(self) -> json:
         """Api call with proper URL
@@ -28,7 +48,28 @@ class CityForecast:
             json: Request result in JSON format
         """
         url = self._build_forecast_request_url()
-        return ApiRequests.api_get_request(url)
+        cached_response = self.cache.get(url)
+        if cached_response is not None:
+            return cached_response
+        response = ApiRequests.api_get_request(url)
+        if self._check_response_content(response):
+            self.cache.put(url, response)
+        return response
+
+    @staticmethod
+    def _check_response_content(response: json) -> bool:
+        """Validation if the Api response can be cached
+
+        Args:
+            response (json): API response in JSON format
+
+        Returns:
+            bool: True if response is not empty and is not an API error
+        """
+        if not response:
+            return False
+        items = response if isinstance(response, list) else [response]
+        return not any(item.get("error") for item in items)
 
 
 class DetailedForecast(CityForecast):
@@ -37,6 +78,7 @@ class DetailedForecast(CityForecast):
     """
 
     def __init__(self, coordinates: dict, start_date: str, end_date: str):
+        coordinates = self.grid.snap(coordinates)
         self.longitude = coordinates["lon"]
         self.latitude = coordinates["lat"]
         self.start_date = start_date
@@ -51,10 +93,35 @@ class DetailedForecast(CityForecast):
         return f"https://api.open-meteo.com/v1/forecast?latitude={self.latitude}&longitude={self.longitude}&daily=weathercode,temperature_2m_max,temperature_2m_min,rain_sum,showers_sum,windspeed_10m_max&start_date={self.start_date}&end_date={self.end_date}&timezone=Europe%2FBerlin"
 
 
+class MultiLocationForecast(DetailedForecast):
+    """Class for checking detailed forecast for many locations and date range with one API call"""
+
+    def __init__(self, coordinates_list: list, start_date: str, end_date: str):
+        coordinates_list = [self.grid.snap(coords) for coords in coordinates_list]
+        self.longitude = ",".join(str(coords["lon"]) for coords in coordinates_list)
+        self.latitude = ",".join(str(coords["lat"]) for coords in coordinates_list)
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def make_forecast_request(self) -> list:
+        """Api call with proper URL
+
+        Returns:
+            list: Request results in JSON format - one item per location
+        """
+        response = super().make_forecast_request()
+        if isinstance(response, dict):
+            return [response]
+        return response
+
+
 class HistoricalWeather(DetailedForecast):
     """Class for checking historical temperature forecast"""
 
+    grid = ARCHIVE_GRID
+
     def __init__(self, coordinates: dict, start_date: str, end_date: str):
+        coordinates = self.grid.snap(coordinates)
         self.longitude = coordinates["lon"]
         self.latitude = coordinates["lat"]
         self.start_date = start_date
@@ -67,3 +134,23 @@ class HistoricalWeather(DetailedForecast):
             str: URL in format ready to use in API call
         """
         return f"https://archive-api.open-meteo.com/v1/archive?latitude={self.latitude}&longitude={self.longitude}&start_date={self.start_date}&end_date={self.end_date}&hourly=temperature_2m"
+
+    def fetch_hourly(self, variables: list):
+        """Api call with response decoded straight into numpy arrays while it is received
+
+        Args:
+            variables (list): Hourly variables to decode
+
+        Returns:
+            tuple: (times as datetime64[h] array, {variable: float32 array}), False or api error json
+        """
+        from archive_decoder import HourlyStreamDecoder
+
+        days = (
+            datetime.date.fromisoformat(self.end_date)
+            - datetime.date.fromisoformat(self.start_date)
+        ).days + 1
+        return ApiRequests.api_get_stream(
+            self._build_forecast_request_url(),
+            HourlyStreamDecoder(variables, expected_length=max(days, 0) * 24),
+        )
@@ -0,0 +1,151 @@
+"""To handle persistent cache of city coordinates
+
+Coordinates of a (city, street) pair never change, so they are kept in a small
+SQLite file and served from memory on repeated lookups.
+"""
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+
+GEOCODE_CACHE_FILE = "geocode_cache.sqlite"
+GEOCODE_CACHE_MAX_ENTRIES = 10000
+# Time to live in seconds, None - cached coordinates never expire
+GEOCODE_CACHE_TTL = None
+
+
+class GeocodeCache:
+    """Persistent LRU cache for coordinates keyed by normalized city and street"""
+
+    def __init__(
+        self,
+        path: str = GEOCODE_CACHE_FILE,
+        max_entries: int = GEOCODE_CACHE_MAX_ENTRIES,
+        ttl: float = GEOCODE_CACHE_TTL,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = None
+        # key -> [lat, lon, created, last_used]
+        self._entries = {}
+        self._dirty = set()
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0}
+
+    @staticmethod
+    def normalize_key(city: str, street: str) -> str:
+        """Build cache key insensitive to letter case and extra whitespaces
+
+        Args:
+            city (str): City name
+            street (str): Street name
+
+        Returns:
+            str: Normalized key in format "city|street"
+        """
+        return f"{' '.join(str(city).split()).casefold()}|{' '.join(str(street).split()).casefold()}"
+
+    def _open(self):
+        """Open SQLite file and load all entries into memory"""
+        if self._connection is not None:
+            return
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            "key TEXT PRIMARY KEY, lat REAL, lon REAL, created REAL, last_used REAL)"
+        )
+        rows = self._connection.execute(
+            "SELECT key, lat, lon, created, last_used FROM geocode"
+        )
+        for key, lat, lon, created, last_used in rows:
+            self._entries[key] = [lat, lon, created, last_used]
+        atexit.register(self.flush)
+
+    def _is_expired(self, entry: list, now: float) -> bool:
+        return self.ttl is not None and now - entry[2] > self.ttl
+
+    def get(self, city: str, street: str, allow_stale: bool = False) -> dict:
+        """Get cached coordinates
+
+        Args:
+            city (str): City name
+            street (str): Street name
+            allow_stale (bool): Return also entries older than TTL
+
+        Returns:
+            dict: Dictionary {"lat": value, "lon": value} or None if not cached
+        """
+        key = self.normalize_key(city, street)
+        now = time.time()
+        with self._lock:
+            self._open()
+            entry = self._entries.get(key)
+            if entry is None or (not allow_stale and self._is_expired(entry, now)):
+                if not allow_stale:
+                    self.counters["misses"] += 1
+                return None
+            self.counters["stale_hits" if allow_stale else "hits"] += 1
+            entry[3] = now
+            self._dirty.add(key)
+            return {"lat": entry[0], "lon": entry[1]}
+
+    def put(self, city: str, street: str, coordinates: dict):
+        """Store coordinates and evict least recently used entries above the limit
+
+        Args:
+            city (str): City name
+            street (str): Street name
+            coordinates (dict): Dictionary {"lat": value, "lon": value}
+        """
+        key = self.normalize_key(city, street)
+        now = time.time()
+        with self._lock:
+            self._open()
+            self._entries[key] = [coordinates["lat"], coordinates["lon"], now, now]
+            self._dirty.discard(key)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)",
+                (key, coordinates["lat"], coordinates["lon"], now, now),
+            )
+            if len(self._entries) > self.max_entries:
+                self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """Remove least recently used entries to fit max_entries"""
+        overflow = len(self._entries) - self.max_entries
+        oldest = sorted(self._entries, key=lambda key: self._entries[key][3])[:overflow]
+        for key in oldest:
+            del self._entries[key]
+            self._dirty.discard(key)
+        self._connection.executemany(
+            "DELETE FROM geocode WHERE key = ?", [(key,) for key in oldest]
+        )
+        logging.debug("Geocode cache: evicted %s entries", len(oldest))
+
+    def flush(self):
+        """Persist last usage times of entries read since the last flush"""
+        with self._lock:
+            if self._connection is None or not self._dirty:
+                return
+            self._connection.executemany(
+                "UPDATE geocode SET last_used = ? WHERE key = ?",
+                [
+                    (self._entries[key][3], key)
+                    for key in self._dirty
+                    if key in self._entries
+                ],
+            )
+            self._connection.commit()
+            self._dirty.clear()
+
+    def stats(self) -> dict:
+        """Hit and miss counters
+
+        Returns:
+            dict: Counters
+        """
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries))
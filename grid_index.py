@@ -0,0 +1,57 @@
+"""To handle snapping coordinates to weather model grid
+
+Weather models compute values for grid cells several kilometres wide, so all
+locations inside one cell get the same forecast. Snapping coordinates to the model
+grid point makes their requests identical, so they are fetched and cached once.
+Grid points of both models lie on multiples of their resolution. API corrects
+temperature for elevation of the sent point - the grid point is at most half a
+cell away from the location.
+"""
+# Grid resolution in degrees of models picked by API for Europe by default -
+# forecast ICON-EU (0.0625, ~7 km), archive ERA5-Land for temperature (0.1, ~11 km)
+FORECAST_GRID_RESOLUTION = 0.0625
+ARCHIVE_GRID_RESOLUTION = 0.1
+COORDINATES_PRECISION = 4
+
+
+class GridIndex:
+    """Snap coordinates to centers of grid cells"""
+
+    def __init__(self, resolution: float):
+        self.resolution = resolution
+
+    def cell(self, coords_dict: dict) -> tuple:
+        """Center of the grid cell containing coordinates
+
+        Args:
+            coords_dict (dict): Dictionary {"lat": value, "lon": value}
+
+        Returns:
+            tuple: (lat, lon) of the cell center
+        """
+        return (
+            round(
+                round(coords_dict["lat"] / self.resolution) * self.resolution,
+                COORDINATES_PRECISION,
+            ),
+            round(
+                round(coords_dict["lon"] / self.resolution) * self.resolution,
+                COORDINATES_PRECISION,
+            ),
+        )
+
+    def snap(self, coords_dict: dict) -> dict:
+        """Snap coordinates to the grid cell center
+
+        Args:
+            coords_dict (dict): Dictionary {"lat": value, "lon": value}
+
+        Returns:
+            dict: Dictionary {"lat": value, "lon": value} of the cell center
+        """
+        lat, lon = self.cell(coords_dict)
+        return {"lat": lat, "lon": lon}
+
+
+FORECAST_GRID = GridIndex(FORECAST_GRID_RESOLUTION)
+ARCHIVE_GRID = GridIndex(ARCHIVE_GRID_RESOLUTION)
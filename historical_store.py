@@ -0,0 +1,170 @@
+"""To handle local store of historical weather data
+
+Archive data never changes, so hourly values are kept in one compact numpy file
+per location and only date ranges missing in the file are fetched from API.
+"""
+import datetime
+import logging
+import os
+import tempfile
+import numpy as np
+from forecast import HistoricalWeather
+from grid_index import ARCHIVE_GRID
+from singleflight import KeyedLocks
+
+HISTORICAL_STORE_DIR = "historical_store"
+# Missing days closer than this are fetched with one archive request
+MAX_GAP_DAYS = 400
+ARCHIVE_VARIABLE = "temperature_2m"
+# Threads updating the same cell file wait for each other
+CELL_LOCKS = KeyedLocks()
+
+
+class HistoricalStore:
+    """Store of hourly archive data - one file per archive grid cell"""
+
+    def __init__(
+        self, directory: str = HISTORICAL_STORE_DIR, max_gap_days: int = MAX_GAP_DAYS
+    ):
+        self.directory = directory
+        self.max_gap_days = max_gap_days
+
+    def _cell_path(self, coords_dict: dict) -> str:
+        """Path of the file for grid cell containing location
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+
+        Returns:
+            str: Path to numpy file
+        """
+        lat, lon = ARCHIVE_GRID.cell(coords_dict)
+        return os.path.join(
+            self.directory, f"{lat:.2f}_{lon:.2f}_{ARCHIVE_VARIABLE}.npz"
+        )
+
+    def _load(self, coords_dict: dict) -> tuple:
+        """Load stored data for location
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+
+        Returns:
+            tuple: (times as datetime64[h] array, values as float32 array)
+        """
+        path = self._cell_path(coords_dict)
+        if not os.path.exists(path):
+            return np.array([], dtype="datetime64[h]"), np.array([], dtype=np.float32)
+        with np.load(path) as stored:
+            return stored["time"], stored["values"]
+
+    def _save(self, coords_dict: dict, times: np.ndarray, values: np.ndarray):
+        """Write data for location - file is replaced atomically
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+            times (np.ndarray): Hourly times
+            values (np.ndarray): Hourly values
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._cell_path(coords_dict)
+        descriptor, temporary_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.savez(file, time=times, values=values)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    def _plan_spans(self, missing_days: list) -> list:
+        """Join missing days into the fewest date spans
+
+        Args:
+            missing_days (list): Sorted list of datetime.date
+
+        Returns:
+            list: List of tuples (start date, end date)
+        """
+        spans = []
+        for day in missing_days:
+            if spans and (day - spans[-1][1]).days <= self.max_gap_days:
+                spans[-1][1] = day
+            else:
+                spans.append([day, day])
+        return [tuple(span) for span in spans]
+
+    @staticmethod
+    def _fetch(coords_dict: dict, start: datetime.date, end: datetime.date) -> tuple:
+        """Fetch archive data for date span - response is decoded while it is received
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+            start (datetime.date): First day
+            end (datetime.date): Last day
+
+        Returns:
+            tuple: (times as datetime64[h] array, values as float32 array), empty if request failed
+        """
+        result = HistoricalWeather(
+            coords_dict, start.isoformat(), end.isoformat()
+        ).fetch_hourly([ARCHIVE_VARIABLE])
+        if not isinstance(result, tuple):
+            # Failed days stay missing and are fetched again next time
+            logging.info(
+                "Error: Archive data for %s - %s not received: %s", start, end, result
+            )
+            return np.array([], dtype="datetime64[h]"), np.array([], dtype=np.float32)
+        times, values = result
+        return times, values[ARCHIVE_VARIABLE]
+
+    def get_ranges(self, coords_dict: dict, dates: dict) -> dict:
+        """Get hourly data for date ranges, fetching only days missing in the store
+
+        Args:
+            coords_dict (dict): Coordinates of the city
+            dates (dict): Date ranges {"YYYY-MM-DD":"YYYY-MM-DD"}
+
+        Returns:
+            dict: {start date: (times, values)} for every date range
+        """
+        # Days fetched by another thread meanwhile are loaded, not fetched again
+        with CELL_LOCKS.lock(self._cell_path(coords_dict)):
+            times, values = self._load(coords_dict)
+            stored_days = set(np.unique(times.astype("datetime64[D]")).tolist())
+
+            needed_days = set()
+            for start, end in dates.items():
+                day = datetime.date.fromisoformat(start)
+                while day <= datetime.date.fromisoformat(end):
+                    needed_days.add(day)
+                    day += datetime.timedelta(days=1)
+            missing_days = sorted(needed_days - stored_days)
+
+            if missing_days:
+                spans = self._plan_spans(missing_days)
+                logging.info(
+                    "INFO: %s missing days of historical data fetched with %s archive requests \n",
+                    len(missing_days),
+                    len(spans),
+                )
+                for start, end in spans:
+                    new_times, new_values = self._fetch(coords_dict, start, end)
+                    times = np.concatenate([new_times, times])
+                    values = np.concatenate([new_values, values])
+                times, unique_index = np.unique(times, return_index=True)
+                values = values[unique_index]
+                # Days not published in archive yet are fetched again next time
+                days = times.astype("datetime64[D]")
+                published_days = np.unique(days[~np.isnan(values)])
+                keep = np.isin(days, published_days)
+                times, values = times[keep], values[keep]
+                self._save(coords_dict, times, values)
+
+        ranges = {}
+        for start, end in dates.items():
+            mask = (times >= np.datetime64(start, "h")) & (
+                times < np.datetime64(end, "h") + np.timedelta64(24, "h")
+            )
+            ranges[start] = (times[mask], values[mask])
+        return ranges
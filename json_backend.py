@@ -0,0 +1,23 @@
+"""To handle decoding of JSON responses
+
+orjson is used if it is installed, standard json module otherwise. Module has no
+heavy dependencies, so it is safe to import at startup.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # optional faster backend
+    orjson = None
+
+
+def loads(body: bytes):
+    """Decode JSON with the fastest available backend
+
+    Args:
+        body (bytes): JSON document
+
+    Returns:
+        Any: Decoded document
+    """
+    return orjson.loads(body) if orjson is not None else json.loads(body)
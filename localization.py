@@ -3,11 +3,18 @@ import logging
 import json
 import sys
 from api_requests import ApiRequests
+from geocode_cache import GeocodeCache
+
+
+class LocalizationNotFoundError(LookupError):
+    """Geocoder did not return coordinates for city and street"""
 
 
 class CityLocalization:
     """Gather coordinates based on city name and street"""
 
+    cache = GeocodeCache()
+
     def __init__(self, city: str, street: str):
         self.city = city
         self.street = street
@@ -26,16 +33,56 @@ class CityLocalization:
         Returns:
             dict: Dictionary {"lat": value, "lon": value} or closing app if response is wrong
         """
+        try:
+            return self.find_coordinates()
+        except LocalizationNotFoundError:
+            logging.info("Localization did not find - please Check City and Street")
+            sys.exit()
+
+    def find_coordinates(self) -> dict:
+        """Get coordinates from cache or API response
+
+        Raises:
+            LocalizationNotFoundError: Geocoder did not find city and street
+
+        Returns:
+            dict: Dictionary {"lat": value, "lon": value}
+        """
+        cached_coordinates = self.cache.get(self.city, self.street)
+        if cached_coordinates is not None:
+            return self._round_coordinates(cached_coordinates)
+
         url = self._build_coordinates_request_url()
         coordinates_request_response = ApiRequests.api_get_request(url)
         if self._check_response_content(coordinates_request_response):
-            return {
-                "lat": round(float(coordinates_request_response[0]["lat"]), 2),
-                "lon": round(float(coordinates_request_response[0]["lon"]), 2),
+            coordinates = {
+                "lat": float(coordinates_request_response[0]["lat"]),
+                "lon": float(coordinates_request_response[0]["lon"]),
             }
-        else:
-            logging.info("Localization did not find - please Check City and Street")
-            sys.exit()
+            self.cache.put(self.city, self.street, coordinates)
+            return self._round_coordinates(coordinates)
+
+        # Geocoder is down or rate limiting - expired entry is better than nothing
+        stale_coordinates = self.cache.get(self.city, self.street, allow_stale=True)
+        if stale_coordinates is not None:
+            logging.info("Info: Geocoder unavailable - using cached coordinates")
+            return self._round_coordinates(stale_coordinates)
+        raise LocalizationNotFoundError(f"{self.city}, {self.street}")
+
+    @staticmethod
+    def _round_coordinates(coordinates: dict) -> dict:
+        """Round coordinates to 2 decimal places
+
+        Args:
+            coordinates (dict): Dictionary {"lat": value, "lon": value}
+
+        Returns:
+            dict: Dictionary {"lat": value, "lon": value}
+        """
+        return {
+            "lat": round(coordinates["lat"], 2),
+            "lon": round(coordinates["lon"], 2),
+        }
 
     def _check_response_content(self, response: json) -> bool:
         """Validation if the Api resoponse is not empty
@@ -47,6 +94,6 @@ class CityLocalization:
             bool: True if JSON is not empty, else False
         """
 
-        if len(response) > 0:
+        if response and len(response) > 0:
             return True
         return False
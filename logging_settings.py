@@ -1,23 +1,93 @@
-"""Logging settings"""
+"""Logging settings
+
+Records are written to the log file by a background thread, so logging never waits
+for the disk. Console output stays synchronous to keep it in order with input prompts.
+"""
+import atexit
+import json
 import logging
-import time
+import os
+import queue
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+
+LOG_FILE = "weather_forecast_tool.log"
+JSON_LOG_FILE = "weather_forecast_tool.jsonl"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# "text" or "json" - JSON lines output
+LOG_FORMAT_ENV = "WEATHER_LOG_FORMAT"
+# "size" or "time" - rotation at midnight
+LOG_ROTATION_ENV = "WEATHER_LOG_ROTATION"
+# Records of threads with this name prefix go to log file only, not between prompts
+BACKGROUND_THREAD_PREFIX = "prefetch"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format record as JSON
+
+        Args:
+            record (logging.LogRecord): Log record
+
+        Returns:
+            str: JSON line
+        """
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage().strip(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
 
 
-def set_logger():
-    """Set logger properties"""
+def set_logger(json_lines: bool = None, rotation: str = None):
+    """Set logger properties
+
+    Args:
+        json_lines (bool): Write log file as JSON lines, taken from WEATHER_LOG_FORMAT if None
+        rotation (str): "size" or "time", taken from WEATHER_LOG_ROTATION if None
+    """
+    if json_lines is None:
+        json_lines = os.environ.get(LOG_FORMAT_ENV, "text") == "json"
+    rotation = rotation or os.environ.get(LOG_ROTATION_ENV, "size")
 
     level = logging.INFO
     message_format = "%(message)s"
+    log_file = JSON_LOG_FILE if json_lines else LOG_FILE
+    if rotation == "time":
+        file_handler = TimedRotatingFileHandler(
+            log_file, when="midnight", backupCount=LOG_BACKUP_COUNT
+        )
+    else:
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+        )
+    file_handler.setFormatter(
+        JsonLinesFormatter() if json_lines else logging.Formatter(message_format)
+    )
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    console_handler = logging.StreamHandler()
+    console_handler.addFilter(
+        lambda record: not record.threadName.startswith(BACKGROUND_THREAD_PREFIX)
+    )
     handlers = [
-        logging.FileHandler(f"{logging_date()}_log.txt"),
-        logging.StreamHandler(),
+        QueueHandler(log_queue),
+        console_handler,
     ]
     logging.basicConfig(level=level, format=message_format, handlers=handlers)
-
-
-def logging_date() -> str:
-    """Format date for logging file
-    Returns:
-        str: date DD_MM_YYYY_HHMMSS
-    """
-    return time.strftime("%d_%m_%Y_%H%M%S")
@@ -1,18 +1,29 @@
-""" Main module"""
-import datetime
+"""Main module
+
+Heavy dependencies (pandas, matplotlib, folium, PyQt6) are imported inside the options
+which need them, so the menu is shown without waiting for them.
+"""
+import atexit
 import logging
+import os
 import sys
-import folium
-import matplotlib.pyplot as plt
-import pandas as pd
 
-from PyQt6.QtWidgets import QApplication
+from api_requests import ApiRequests
 from app_menu import CliMenu
 from localization import CityLocalization
-from forecast import CityForecast, HistoricalWeather, DetailedForecast
+from forecast import CityForecast, ForecastUnavailableError
 from logging_settings import set_logger
 from enums import ForecastTypes, Coordinates
-from ux import MainWindow
+from metrics import Metrics
+from prefetch import PREFETCHER
+from record_store import RECORD_FILE, RECORD_MODE_ENV, REPLAY, RecordStore
+from request_scheduler import RequestScheduler
+
+# Default location and parameters offered by the prompts
+DEFAULT_CITY = "Wroclaw"
+DEFAULT_STREET = "Fabryczna"
+DEFAULT_DAYS = "5"
+DEFAULT_YEARS = "4"
 
 
 def app_run():
@@ -39,42 +50,94 @@ def app_run():
         app_run()
 
 
-def build_one_data_frame(days: str, coords_dict: dict, data: ForecastTypes):
-    """Function to build one dataframe from API response as JSON
+def build_time_series(days: str, coords_dict: dict, data_types: list):
+    """Function to build time series with many forecast types from one API call
 
     Args:
         days (str): Number of forecast days
         coords_dict (dict): Coordinates of the city
-        data (ForecastTypes): Type of forecasts - Enum type
+        data_types (list): Types of forecasts - list of ForecastTypes
+
+    Raises:
+        ForecastUnavailableError: API call failed or returned error
 
     Returns:
-        dataframe: Pandas DataFrame
+        TimeSeriesBlock: One row per forecast type
     """
-    city_forecast_data = CityForecast(coords_dict, days, data.value)
-    forecast_request_response = city_forecast_data.make_forecast_request()
-    time_hourly = forecast_request_response["hourly"]["time"]
-    data_value = forecast_request_response["hourly"][data.value]
+    from timeseries import TimeSeriesBlock
 
-    # Build dataframe from lists
-    data_f = pd.DataFrame(data_value, index=time_hourly, columns=[data.value])
-    return data_f
+    city_forecast_data = CityForecast(
+        coords_dict, days, [data.value for data in data_types]
+    )
+    forecast_request_response = city_forecast_data.make_forecast_request()
+    if not CityForecast._check_response_content(forecast_request_response):
+        raise ForecastUnavailableError(
+            f"No forecast for coordinates {coords_dict}: {forecast_request_response}"
+        )
+    return TimeSeriesBlock.from_hourly_response(
+        forecast_request_response["hourly"], [data.value for data in data_types]
+    )
 
 
-def build_data_frames(days: str, coords_dict: dict) -> list:
-    """Build all data frames for option 1
+def build_forecast_time_series(days: str, coords_dict: dict):
+    """Build time series with all forecast types for option 1
     Args:
         days (str): Number of forecast days
         coords_dict (dict): Coordinates of the city
 
     Returns:
-        list: list of dataframes
+        TimeSeriesBlock: One row per ForecastTypes member
     """
-    dataframe = []
+    return build_time_series(days, coords_dict, list(ForecastTypes))
 
-    for data in ForecastTypes:
-        data_f = build_one_data_frame(days, coords_dict, data)
-        dataframe.append(data_f)
-    return dataframe
+
+def plot_time_series(ax, block, times=None):
+    """Plot every series of the block as separate line
+
+    Args:
+        ax (matplotlib.axes.Axes): Axes to draw on
+        block (TimeSeriesBlock): Time series to plot
+        times (np.ndarray): X values, block timestamps if None
+    """
+    times = block.times if times is None else times
+    for label in block.labels:
+        values = block.view(label)
+        ax.plot(times[: len(values)], values[: len(times)], label=label)
+
+
+def plot_climatology_bands(ax, bands, times):
+    """Plot historical percentile bands - min-max and p10-p90 ranges with median line
+
+    Args:
+        ax (matplotlib.axes.Axes): Axes to draw on
+        bands (TimeSeriesBlock): Bands returned by ClimatologyIndex.lookup
+        times (np.ndarray): X values
+    """
+    length = min(len(times), len(bands))
+    times = times[:length]
+    ax.fill_between(
+        times,
+        bands.view("min")[:length],
+        bands.view("max")[:length],
+        alpha=0.15,
+        color="tab:gray",
+        label="historical min-max",
+    )
+    ax.fill_between(
+        times,
+        bands.view("p10")[:length],
+        bands.view("p90")[:length],
+        alpha=0.3,
+        color="tab:gray",
+        label="historical p10-p90",
+    )
+    ax.plot(
+        times,
+        bands.view("median")[:length],
+        color="tab:gray",
+        linestyle="--",
+        label="historical median",
+    )
 
 
 def set_plot_paramerers(city: str, days: str):
@@ -84,10 +147,13 @@ def set_plot_paramerers(city: str, days: str):
         city (str): City name
         days (str): Number of days
     """
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+
     plt.xticks(rotation=45)
     plt.ylabel("Data")
     plt.xlabel("Time")
-    plt.locator_params(nbins=10)
+    plt.gca().xaxis.set_major_locator(mdates.AutoDateLocator(maxticks=10))
     plt.title(f"{days} days Forecast for {city}")
     plt.legend()
 
@@ -95,23 +161,32 @@ def set_plot_paramerers(city: str, days: str):
 def run_option_1():
     """OPTION 1: Check weather forecast for particular localization \
         - temperature, shower, cloudcover"""
+    import matplotlib.pyplot as plt
+
     city = (
-        input("Enter city or press Enter to use default value [Wroclaw]: ") or "Wroclaw"
+        input(f"Enter city or press Enter to use default value [{DEFAULT_CITY}]: ")
+        or DEFAULT_CITY
     )
     street = (
-        input("Enter street or press Enter to use default value [Fabryczna]: ")
-        or "Fabryczna"
+        input(f"Enter street or press Enter to use default value [{DEFAULT_STREET}]: ")
+        or DEFAULT_STREET
     )
+    # Location is geocoded while user enters the rest of parameters
+    PREFETCHER.cancel()
+    PREFETCHER.submit(geocode, city, street)
     days = (
-        input("Enter number of days (max 16) or press Enter to use default value [5]: ")
-        or "5"
+        input(
+            f"Enter number of days (max 16) or press Enter to use default value [{DEFAULT_DAYS}]: "
+        )
+        or DEFAULT_DAYS
     )
     if not 0 < int(days) < 17:
         logging.info("Error: You can choose only from 1 to 15 days \n")
         sys.exit()
     logging.info("INFO: Api call for city coordinates \n")
     city_loc = CityLocalization(city, street)
-    coords_dict = city_loc.get_coordinates_from_response()
+    with Metrics.stage("option_1.geocode"):
+        coords_dict = city_loc.get_coordinates_from_response()
     logging.info(
         "INFO: %s days forecast will be prepared for city: %s and street: %s - coordinates: %s : %s \n",
         days,
@@ -120,93 +195,104 @@ def run_option_1():
         coords_dict[Coordinates.LATITUDE.value],
         coords_dict[Coordinates.LONGITUDE.value],
     )
+    PREFETCHER.submit(build_forecast_time_series, days, coords_dict)
     if not CliMenu.check_if_key_pressed():
+        PREFETCHER.cancel()
         sys.exit()
 
-    data_frame_list = build_data_frames(days, coords_dict)
-    ax = data_frame_list[0].plot()
-    data_frame_list[1].plot(ax=ax)
-    data_frame_list[2].plot(ax=ax)
+    with Metrics.stage("option_1.forecast"):
+        forecast = build_forecast_time_series(days, coords_dict)
+    with Metrics.stage("option_1.plot"):
+        _, ax = plt.subplots()
+        plot_time_series(ax, forecast)
+        set_plot_paramerers(city, days)
     logging.info("INFO: Please check opened plot in separate window")
-    set_plot_paramerers(city, days)
     plt.show()
 
 
-def prepare_dates_range(
-    start_date: datetime, forecast_days: int, history_years: int
-) -> dict:
-    """Function to calculate date ranges based on start date, numer of forecast days and number of years for historical data
+def build_climatology_comparison(days: str, coords_dict: dict, years: int) -> tuple:
+    """Temperature forecast compared with climatology of last years
 
     Args:
-        start_date (datetime): Start date in format YYYY-MM-DD
-        forecast_days (int): Number of days
-        history_years (int): Number of years
+        days (str): Number of forecast days
+        coords_dict (dict): Coordinates of the city
+        years (int): Number of years (history)
 
     Returns:
-        dict: Dict with date ranges {"YYY-MM-DD":"YYYY-MM-DD"}
+        tuple: (forecast, bands, ranks) - forecast and bands blocks, percentile of every forecast hour
     """
-    SHIFT_TIME = "%Y-%m-%d"
-    dates_ranges = {}
-    start_day = start_date.day
-    start_year = start_date.year - 1
-    start_month = start_date.month
-    end_day = start_day + int(forecast_days) - 1
-
-    for _ in range(history_years):
-        today_date = datetime.datetime(start_year, start_month, start_day).date()
-        end_date = datetime.datetime(start_year, start_month, end_day).date()
-        dates_ranges[today_date.strftime(SHIFT_TIME)] = end_date.strftime(SHIFT_TIME)
-        start_year -= 1
-    return dates_ranges
+    from climatology_index import ClimatologyIndex
+
+    with Metrics.stage("option_2.forecast"):
+        forecast = build_time_series(days, coords_dict, [ForecastTypes.TEMPERATURE])
+    # Index is built from archive only once per grid cell and number of years
+    climatology_index = ClimatologyIndex(years)
+    with Metrics.stage("option_2.climatology"):
+        bands = climatology_index.lookup(coords_dict, forecast.times)
+        ranks = climatology_index.percentile_rank(
+            coords_dict, forecast.times, forecast.view(ForecastTypes.TEMPERATURE.value)
+        )
+    return forecast, bands, ranks
 
 
-def build_data_frames_historical(coords_dict: dict, dates: dict) -> list:
-    """Build Dataframes for particular date ranges
+def prepare_climatology_index(coords_dict: dict, years: int):
+    """Build climatology index of location if it does not exist yet
 
     Args:
-        coords_dict (dict): City coordinates
-        dates (dict): Date ranges
+        coords_dict (dict): Coordinates of the city
+        years (int): Number of years (history)
+    """
+    from climatology_index import ClimatologyIndex
 
-    Returns:
-        list: List of dataframes
+    ClimatologyIndex(years).prepare(coords_dict)
+
+
+def prefetch_climatology_comparison(days: str, coords_dict: dict, years: int):
+    """Start requests of build_climatology_comparison in background
+
+    Args:
+        days (str): Number of forecast days
+        coords_dict (dict): Coordinates of the city
+        years (int): Number of years (history)
     """
-    dataframe = []
-    for key, value in dates.items():
-        city_historical_data = HistoricalWeather(coords_dict, key, value)
-        forecast_request_response = city_historical_data.make_forecast_request()
-        time_hourly = forecast_request_response["hourly"]["time"]
-        data_value = forecast_request_response["hourly"]["temperature_2m"]
-        data_f = pd.DataFrame(data_value, index=time_hourly, columns=[key[:4]])
-        dataframe.append(data_f)
-    return dataframe
+    PREFETCHER.submit(build_time_series, days, coords_dict, [ForecastTypes.TEMPERATURE])
+    PREFETCHER.submit(prepare_climatology_index, coords_dict, years)
 
 
 def run_option_2():
     """OPTION 2: Check weather temperature forecast for particular localization and days and add historical data from number of years"""
+    import matplotlib.pyplot as plt
+    import numpy as np
+
     city = (
-        input("Enter city or press Enter to use default value [Wroclaw]: ") or "Wroclaw"
+        input(f"Enter city or press Enter to use default value [{DEFAULT_CITY}]: ")
+        or DEFAULT_CITY
     )
     street = (
-        input("Enter street or press Enter to use default value [Fabryczna]: ")
-        or "Fabryczna"
+        input(f"Enter street or press Enter to use default value [{DEFAULT_STREET}]: ")
+        or DEFAULT_STREET
     )
+    # Location is geocoded while user enters the rest of parameters
+    PREFETCHER.cancel()
+    PREFETCHER.submit(geocode, city, street)
     forecast_days = (
         input(
-            "Enter numbers of days (max 16) or press Enter to use default value [5]: "
+            f"Enter numbers of days (max 16) or press Enter to use default value [{DEFAULT_DAYS}]: "
         )
-        or "5"
+        or DEFAULT_DAYS
     )
     historical_data = (
         input(
-            "Enter numbers of years (history) or press Enter to use default value [4]: "
+            f"Enter numbers of years (history) or press Enter to use default value [{DEFAULT_YEARS}]: "
         )
-        or "4"
+        or DEFAULT_YEARS
     )
     if not 0 < int(forecast_days) < 17:
         logging.info("Error: You can choose only from 1 to 15 days \n")
         sys.exit()
     city_loc = CityLocalization(city, street)
-    coords_dict = city_loc.get_coordinates_from_response()
+    with Metrics.stage("option_2.geocode"):
+        coords_dict = city_loc.get_coordinates_from_response()
     logging.info(
         "%s days forecast (compared with last %s years) will be prepared for city: %s and street: %s - coordinates: %s : %s \n",
         forecast_days,
@@ -217,30 +303,47 @@ def run_option_2():
         coords_dict[Coordinates.LONGITUDE.value],
     )
 
+    prefetch_climatology_comparison(forecast_days, coords_dict, int(historical_data))
     if not CliMenu.check_if_key_pressed():
+        PREFETCHER.cancel()
         sys.exit()
-    dates = prepare_dates_range(
-        datetime.datetime.now().date(), forecast_days, int(historical_data)
-    )
-    data_frame_list = build_data_frames_historical(coords_dict, dates)
-    ax = data_frame_list[0].plot()
-    for data_frame in data_frame_list[1:]:
-        data_frame.plot(ax=ax)
-    forcast_data_frame = build_one_data_frame(
-        forecast_days, coords_dict, ForecastTypes.TEMPERATURE
+    forecast, bands, ranks = build_climatology_comparison(
+        forecast_days, coords_dict, int(historical_data)
     )
-    forcast_data_frame.plot(ax=ax)
-
-    set_plot_paramerers(city, str(forecast_days))
+    if ranks.size and not np.isnan(ranks).all():
+        logging.info(
+            "Forecast temperature is on average at %.0f percentile of last %s years (max %.0f, min %.0f) \n",
+            np.nanmean(ranks),
+            historical_data,
+            np.nanmax(ranks),
+            np.nanmin(ranks),
+        )
+    with Metrics.stage("option_2.plot"):
+        _, ax = plt.subplots()
+        plot_climatology_bands(ax, bands, forecast.times)
+        plot_time_series(ax, forecast)
+        set_plot_paramerers(city, str(forecast_days))
     plt.show()
     print()
 
 
 def run_option_3():
     """OPTION 3: Read trip details from CSV file, check wheater forecasts for all places and show them on map"""
+    import pandas as pd
+    from PyQt6.QtWidgets import QApplication
+    from trip_map import build_trip_map, render_html
+    from trip_pipeline import (
+        TripPipeline,
+        MAX_WORKERS,
+        load_trip_results,
+        save_trip_results,
+    )
+    from ux import MainWindow
+
     # read trip details from CSV file
     try:
-        csv_file = pd.read_csv("route_data.csv")
+        with Metrics.stage("option_3.read_csv"):
+            csv_file = pd.read_csv("route_data.csv")
     except FileNotFoundError:
         logging.info("File not found.")
     except pd.errors.EmptyDataError:
@@ -249,80 +352,32 @@ def run_option_3():
         logging.info("Parse error")
     except Exception:
         logging.info("Some other exception")
-    # displaying the contents of the CSV file
-    lat = []
-    lon = []
-    weathercode = []
-    temperature_max = []
-    temperature_min = []
-    rain_sum = []
-    shower_sum = []
-    wind_speed = []
-
-    # Get forecast information for trip places
-    for index, row in csv_file.iterrows():
-        # Get city coodinations
-        city_loc = CityLocalization(row["City"], row["Street"])
-        coords_dict = city_loc.get_coordinates_from_response()
-        lat.append(coords_dict["lat"])
-        lon.append(coords_dict["lon"])
-        # Get forecast
-        fetched_forecast = DetailedForecast(coords_dict, row["Date"], row["Date"])
-        json_with_data = fetched_forecast.make_forecast_request()
-        # Fetch data from JSON and append to lists
-        weathercode.append(json_with_data["daily"]["weathercode"])
-        temperature_max.append(json_with_data["daily"]["temperature_2m_max"])
-        temperature_min.append(json_with_data["daily"]["temperature_2m_min"])
-        rain_sum.append(json_with_data["daily"]["rain_sum"])
-        shower_sum.append(json_with_data["daily"]["showers_sum"])
-        wind_speed.append(json_with_data["daily"]["windspeed_10m_max"])
-
-    # Add lists to dataframes as columns
-    csv_file["Latitude"] = lat
-    csv_file["Longitude"] = lon
-    csv_file["Wheatercode"] = weathercode
-    csv_file["Temp_max"] = temperature_max
-    csv_file["Temp_min"] = temperature_min
-    csv_file["Rain_sum"] = rain_sum
-    csv_file["Shower_sum"] = shower_sum
-    csv_file["Wind_speed_max"] = wind_speed
-
-    logging.info("Current dataframe shape: \n")
-    logging.info(csv_file)
-
-    # Find center localization to set map center position
-    lat_center = lambda lat: (lat[0] + lat[-1]) / 2
-    lon_center = lambda lon: (lon[0] + lon[-1]) / 2
-
-    # Create Folum map
-    folium_map = folium.Map(location=[lat_center(lat), lon_center(lon)], zoom_start=7)
-    # Iterate over dataframe and generate markers on map - check if value of rain or shower is grater than 0 and set marker color as "RED"
-    for index, row in csv_file.iterrows():
-        if row["Rain_sum"][0] > 0 or row["Shower_sum"][0] > 0:
-            color = "red"
-        else:
-            color = "blue"
-        folium.Marker(
-            [row["Latitude"], row["Longitude"]],
-            radius=10,
-            popup=(
-                "City: " + str(row["City"]) + "<br>"
-                "Date: " + str(row["Date"]) + "<br>"
-                "Wheatercode: " + str(row["Wheatercode"]) + "<br>"
-                "Temp_max: " + str(row["Temp_max"]) + "<br>"
-                "Temp_min: " + str(row["Temp_min"]) + "<br>"
-                "Rain_sum: " + str(row["Rain_sum"]) + "<br>"
-                "Shower_sum: " + str(row["Shower_sum"]) + "<br>"
-                "Wind_speed_max:" + str(row["Wind_speed_max"]) + "<br>"
-            ),
-            icon=folium.Icon(icon=str(index + 1), prefix="fa", color=color),
-        ).add_to(folium_map)
-    folium_map.save("map.html")
-
-    # Run pyQT app and show saved map as interactive HTML map
-    app = QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
+    max_workers = (
+        input(
+            f"Enter number of parallel requests or press Enter to use default value [{MAX_WORKERS}]: "
+        )
+        or MAX_WORKERS
+    )
+    # Get forecast information for trip places - only rows changed since last run are fetched
+    with Metrics.stage("option_3.enrich"):
+        csv_file = TripPipeline(int(max_workers)).enrich_incremental(
+            csv_file, load_trip_results()
+        )
+    save_trip_results(csv_file)
+
+    logging.info("Current dataframe shape: %s \n", csv_file.shape)
+    # Whole dataframe is formatted only if debug logging is enabled
+    logging.debug("%s", csv_file)
+
+    # Create Folium map - markers are red if rain or shower is expected
+    with Metrics.stage("option_3.render_map"):
+        html = render_html(build_trip_map(csv_file))
+
+    # Run pyQT app and show map as interactive HTML map
+    with Metrics.stage("option_3.qt_startup"):
+        app = QApplication(sys.argv)
+        window = MainWindow(html)
+        window.show()
     app.exec()
 
 
@@ -330,9 +385,62 @@ def run_option_4():
     """OPTION 4: To close the app"""
     logging.info("You pressed option 4 to close app..")
     logging.info("Closing app...")
+    PREFETCHER.cancel()
     sys.exit()
 
 
+def geocode(city: str, street: str) -> dict:
+    """Get coordinates of location
+
+    Args:
+        city (str): City name
+        street (str): Street name
+
+    Returns:
+        dict: Dictionary {"lat": value, "lon": value}
+    """
+    return CityLocalization(city, street).get_coordinates_from_response()
+
+
+def prefetch_default_location():
+    """Geocode default location and prefetch data of options 1 and 2 for it -
+    runs in background while menu waits for choice"""
+    coords_dict = geocode(DEFAULT_CITY, DEFAULT_STREET)
+    PREFETCHER.submit(build_forecast_time_series, DEFAULT_DAYS, coords_dict)
+    prefetch_climatology_comparison(DEFAULT_DAYS, coords_dict, int(DEFAULT_YEARS))
+
+
+def choose_record_mode():
+    """Use record mode set in environment variable or ask whether to replay
+    responses recorded in local file - responses are not recorded by default"""
+    mode = os.environ.get(RECORD_MODE_ENV)
+    if (
+        mode is None
+        and os.path.exists(RECORD_FILE)
+        and CliMenu.check_if_key_pressed_yes_no()
+    ):
+        mode = REPLAY
+    if mode:
+        ApiRequests.records = RecordStore(mode=mode)
+
+
+def dump_metrics():
+    """Save metrics summary of the run together with cache statistics"""
+    extra = {
+        "response_cache": CityForecast.cache.stats(),
+        "geocode_cache": CityLocalization.cache.stats(),
+        "scheduler": RequestScheduler.stats(),
+        "prefetch": PREFETCHER.stats(),
+    }
+    if ApiRequests.records is not None:
+        extra["records"] = ApiRequests.records.stats()
+    Metrics.dump(extra=extra)
+
+
 if __name__ == "__main__":
     set_logger()
+    Metrics.start_profiling()
+    atexit.register(dump_metrics)
+    choose_record_mode()
+    PREFETCHER.submit(prefetch_default_location)
     app_run()
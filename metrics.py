@@ -0,0 +1,184 @@
+"""To handle performance metrics of API calls and pipeline stages
+
+Metrics are collected in memory and dumped as JSON summary at the end of the run.
+Set WEATHER_PROFILE=1 to also run cProfile and tracemalloc.
+"""
+import cProfile
+import json
+import logging
+import math
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+METRICS_FILE = "metrics.json"
+PROFILE_FILE = "profile.pstats"
+PROFILE_ENV = "WEATHER_PROFILE"
+# Upper bounds of latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+TOP_ALLOCATIONS = 10
+
+
+class Metrics:
+    """Process wide latency histograms, counters and stage timers"""
+
+    _lock = threading.Lock()
+    _endpoints = {}
+    _counters = {}
+    _stages = {}
+    _profiler = None
+
+    @staticmethod
+    def record_request(
+        endpoint: str, seconds: float, retries: int = 0, error: str = None
+    ):
+        """Record one API call
+
+        Args:
+            endpoint (str): Host and path of the call
+            seconds (float): Call duration including retries
+            retries (int): Number of retries done by transport
+            error (str): Error name if call failed
+        """
+        with Metrics._lock:
+            stats = Metrics._endpoints.setdefault(
+                endpoint,
+                {
+                    "count": 0,
+                    "total_s": 0.0,
+                    "max_s": 0.0,
+                    "retries": 0,
+                    "errors": {},
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                },
+            )
+            stats["count"] += 1
+            stats["total_s"] += seconds
+            stats["max_s"] = max(stats["max_s"], seconds)
+            stats["retries"] += retries
+            if error is not None:
+                stats["errors"][error] = stats["errors"].get(error, 0) + 1
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][index] += 1
+                    break
+
+    @staticmethod
+    def increment(name: str, value: int = 1):
+        """Increase named counter
+
+        Args:
+            name (str): Counter name
+            value (int): Value to add
+        """
+        with Metrics._lock:
+            Metrics._counters[name] = Metrics._counters.get(name, 0) + value
+
+    @staticmethod
+    @contextmanager
+    def stage(name: str):
+        """Measure duration of pipeline stage
+
+        Args:
+            name (str): Stage name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with Metrics._lock:
+                stats = Metrics._stages.setdefault(
+                    name, {"count": 0, "total_s": 0.0, "max_s": 0.0}
+                )
+                stats["count"] += 1
+                stats["total_s"] += seconds
+                stats["max_s"] = max(stats["max_s"], seconds)
+
+    @staticmethod
+    def start_profiling():
+        """Start cProfile and tracemalloc if enabled with WEATHER_PROFILE environment variable"""
+        if os.environ.get(PROFILE_ENV) != "1" or Metrics._profiler is not None:
+            return
+        tracemalloc.start()
+        Metrics._profiler = cProfile.Profile()
+        Metrics._profiler.enable()
+
+    @staticmethod
+    def _stop_profiling() -> dict:
+        """Stop profilers, save cProfile stats and summarize allocations
+
+        Returns:
+            dict: Profiling summary, empty if profiling is not running
+        """
+        if Metrics._profiler is None:
+            return {}
+        Metrics._profiler.disable()
+        Metrics._profiler.dump_stats(PROFILE_FILE)
+        Metrics._profiler = None
+        current, peak = tracemalloc.get_traced_memory()
+        top_allocations = tracemalloc.take_snapshot().statistics("lineno")
+        tracemalloc.stop()
+        return {
+            "pstats_file": PROFILE_FILE,
+            "memory_current_kb": round(current / 1024, 1),
+            "memory_peak_kb": round(peak / 1024, 1),
+            "top_allocations": [
+                {"line": str(stat.traceback), "size_kb": round(stat.size / 1024, 1)}
+                for stat in top_allocations[:TOP_ALLOCATIONS]
+            ],
+        }
+
+    @staticmethod
+    def summary() -> dict:
+        """Collected metrics
+
+        Returns:
+            dict: Endpoints, counters and stages statistics
+        """
+        with Metrics._lock:
+            endpoints = {}
+            for endpoint, stats in Metrics._endpoints.items():
+                endpoints[endpoint] = dict(
+                    stats,
+                    errors=dict(stats["errors"]),
+                    mean_s=round(stats["total_s"] / stats["count"], 4),
+                    total_s=round(stats["total_s"], 4),
+                    max_s=round(stats["max_s"], 4),
+                    buckets={
+                        f"le_{bound}": count
+                        for bound, count in zip(LATENCY_BUCKETS, stats["buckets"])
+                    },
+                )
+            stages = {
+                name: {
+                    "count": stats["count"],
+                    "total_s": round(stats["total_s"], 4),
+                    "max_s": round(stats["max_s"], 4),
+                }
+                for name, stats in Metrics._stages.items()
+            }
+            return {
+                "endpoints": endpoints,
+                "counters": dict(Metrics._counters),
+                "stages": stages,
+            }
+
+    @staticmethod
+    def dump(path: str = METRICS_FILE, extra: dict = None):
+        """Write metrics summary as JSON file
+
+        Args:
+            path (str): Output file
+            extra (dict): Additional sections, e.g. cache statistics
+        """
+        summary = Metrics.summary()
+        summary.update(extra or {})
+        profile = Metrics._stop_profiling()
+        if profile:
+            summary["profile"] = profile
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+        logging.info("INFO: Metrics summary saved to %s", path)
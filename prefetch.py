@@ -0,0 +1,88 @@
+"""To handle speculative prefetch while user is at interactive prompts
+
+Forecast and archive requests which are likely to be needed next are started in
+background threads with PREFETCH priority. Their results land in the caches, so
+work started after the prompt is served from cache or joins requests already in
+flight. Background threads are daemons and never delay exit of the app.
+"""
+import logging
+import queue
+import threading
+from enums import RequestPriority
+from logging_settings import BACKGROUND_THREAD_PREFIX
+from request_scheduler import RequestScheduler
+
+PREFETCH_WORKERS = 2
+
+
+class Prefetcher:
+    """Queue of speculative tasks run by background threads"""
+
+    def __init__(self, workers: int = PREFETCH_WORKERS):
+        self.workers = workers
+        self._tasks = queue.SimpleQueue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.counters = {"submitted": 0, "done": 0, "cancelled": 0, "failed": 0}
+
+    def submit(self, function, *args):
+        """Queue task to run in background
+
+        Args:
+            function (callable): Function filling caches, its result is dropped
+            *args: Arguments of the function
+        """
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f"{BACKGROUND_THREAD_PREFIX}-{len(self._threads)}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+            self.counters["submitted"] += 1
+            self._tasks.put((self._generation, function, args))
+
+    def cancel(self):
+        """Drop queued tasks - tasks already running finish in background
+        and only fill the caches"""
+        with self._lock:
+            self._generation += 1
+
+    def _run(self):
+        """Run queued tasks of current generation"""
+        while True:
+            generation, function, args = self._tasks.get()
+            with self._lock:
+                cancelled = generation != self._generation
+                if cancelled:
+                    self.counters["cancelled"] += 1
+            if cancelled:
+                continue
+            try:
+                with RequestScheduler.priority(RequestPriority.PREFETCH):
+                    function(*args)
+            except (Exception, SystemExit) as error:  # pylint: disable=broad-except
+                # Failed prefetch is repeated by the foreground call if needed
+                with self._lock:
+                    self.counters["failed"] += 1
+                logging.debug(
+                    "Prefetch %s%s failed: %s", function.__name__, args, error
+                )
+                continue
+            with self._lock:
+                self.counters["done"] += 1
+
+    def stats(self) -> dict:
+        """Prefetch statistics
+
+        Returns:
+            dict: Number of submitted, done, cancelled and failed tasks
+        """
+        with self._lock:
+            return dict(self.counters)
+
+
+PREFETCHER = Prefetcher()
@@ -0,0 +1,184 @@
+"""To handle record and replay of API responses
+
+Responses are appended to JSON lines file together with their urls. File offset
+of the latest record of every url is kept in memory, so replayed response is read
+with one seek. Replay mode never calls API - offline runs, benchmarks and demos
+get the same responses every time. Recording is opt-in, e.g.:
+
+    WEATHER_RECORD_MODE=record python main.py
+"""
+import codecs
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+RECORD_FILE = "api_records.jsonl"
+RECORD = "record"
+REPLAY = "replay"
+RECORD_MODES = (RECORD, REPLAY)
+# Environment variable enabling record or replay mode
+RECORD_MODE_ENV = "WEATHER_RECORD_MODE"
+# Every line starts with url, so index is built without decoding response bodies
+RECORD_PREFIX = '{"url": '
+
+
+class RecordStore:
+    """Append-only store of raw response bodies indexed by url"""
+
+    def __init__(self, path: str = RECORD_FILE, mode: str = RECORD):
+        if mode not in RECORD_MODES:
+            raise ValueError(f"Record mode must be one of {RECORD_MODES}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._index = None
+        self.counters = {"recorded": 0, "replayed": 0, "missing": 0}
+
+    @property
+    def replay(self) -> bool:
+        """Responses are served from file only"""
+        return self.mode == REPLAY
+
+    def _build_index(self):
+        """Read url and offset of every record - the latest record of url wins"""
+        self._index = {}
+        if not os.path.exists(self.path):
+            return
+        decoder = json.JSONDecoder()
+        with open(self.path, "rb") as file:
+            offset = 0
+            for line in file:
+                text = line.decode("utf-8")
+                if text.startswith(RECORD_PREFIX):
+                    url, _ = decoder.raw_decode(text, len(RECORD_PREFIX))
+                    self._index[url] = offset
+                offset += len(line)
+        logging.info(
+            "INFO: %s recorded responses indexed in %s \n", len(self._index), self.path
+        )
+
+    def get(self, url: str) -> str:
+        """Recorded response body
+
+        Args:
+            url (str): Url of api call
+
+        Returns:
+            str: Raw response body or None if url was not recorded
+        """
+        with self._lock:
+            if self._index is None:
+                self._build_index()
+            offset = self._index.get(url)
+            if offset is None:
+                self.counters["missing"] += 1
+                return None
+            with open(self.path, "rb") as file:
+                file.seek(offset)
+                line = file.readline()
+            self.counters["replayed"] += 1
+        return json.loads(line)["body"]
+
+    def put(self, url: str, status: int, body: str):
+        """Append response to the file
+
+        Args:
+            url (str): Url of api call
+            status (int): HTTP status of response
+            body (str): Raw response body
+        """
+        line = json.dumps({"url": url, "status": status, "body": body}) + "\n"
+        self._append(url, io.BytesIO(line.encode("utf-8")))
+
+    def writer(self, url: str, status: int) -> "RecordWriter":
+        """Writer of response body received in chunks
+
+        Args:
+            url (str): Url of api call
+            status (int): HTTP status of response
+
+        Returns:
+            RecordWriter: Writer appending the record on commit
+        """
+        return RecordWriter(self, url, status)
+
+    def _append(self, url: str, line: io.BufferedIOBase):
+        """Append complete record line to the file and index it
+
+        Args:
+            url (str): Url of api call
+            line (io.BufferedIOBase): Binary file with one encoded record line
+        """
+        with self._lock:
+            if self._index is None:
+                self._build_index()
+            with open(self.path, "ab") as file:
+                file.seek(0, os.SEEK_END)
+                offset = file.tell()
+                shutil.copyfileobj(line, file)
+            self._index[url] = offset
+            self.counters["recorded"] += 1
+
+    def stats(self) -> dict:
+        """Record and replay statistics
+
+        Returns:
+            dict: Mode and counters
+        """
+        with self._lock:
+            return dict(self.counters, mode=self.mode)
+
+
+class RecordWriter:
+    """Record line escaped into temporary file while body is received, so large
+    bodies are not kept in memory - appended to the store only when complete
+
+    Args:
+        store (RecordStore): Store the record is appended to
+        url (str): Url of api call
+        status (int): HTTP status of response
+    """
+
+    def __init__(self, store: RecordStore, url: str, status: int):
+        self.store = store
+        self.url = url
+        self._file = tempfile.TemporaryFile()
+        # Chunks may split multi-byte characters
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        head = json.dumps({"url": url, "status": status, "body": ""})
+        self._file.write(head[: -len('"}')].encode("utf-8"))
+
+    def write(self, chunk: bytes):
+        """Escape next part of response body into the record
+
+        Args:
+            chunk (bytes): Next bytes of the body
+        """
+        self._file.write(self._escape(self._text.decode(chunk)))
+
+    def commit(self):
+        """Close the record line and append it to the store"""
+        self._file.write(self._escape(self._text.decode(b"", final=True)))
+        self._file.write(b'"}\n')
+        self._file.seek(0)
+        self.store._append(self.url, self._file)  # pylint: disable=protected-access
+        self.close()
+
+    def close(self):
+        """Drop temporary file - uncommitted record is discarded"""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def _escape(text: str) -> bytes:
+        """Text escaped the same way as json string content"""
+        return json.dumps(text)[1:-1].encode("utf-8")
@@ -0,0 +1,176 @@
+"""To handle rate limits of API hosts
+
+Every host has a token bucket refilled at the allowed request rate. Threads wait
+for a token in priority order, so interactive requests go ahead of batch and
+prefetch ones. When host answers 429, the bucket is paused for Retry-After and
+its rate is halved, then it grows back step by step while requests succeed.
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from enums import RequestPriority
+
+# Host -> (requests per second, burst size)
+HOST_RATE_LIMITS = {
+    "geocode.maps.co": (1, 1),
+    "api.open-meteo.com": (10, 10),
+    "archive-api.open-meteo.com": (10, 10),
+}
+DEFAULT_RATE_LIMIT = (5, 5)
+# Rate is never reduced below this part of the configured rate
+MIN_RATE_RATIO = 0.1
+# Part of the configured rate added back after every successful request
+RATE_RECOVERY_RATIO = 0.05
+# Pause used when 429 response has no Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class TokenBucket:
+    """Token bucket of one host with waiting queue ordered by priority"""
+
+    def __init__(self, rate: float, burst: int):
+        self.configured_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self._updated = time.monotonic()
+        self._waiting = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float):
+        """Add tokens for time elapsed since last update"""
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority: int) -> float:
+        """Wait until request may be sent
+
+        Args:
+            priority (int): Request priority, lower value is served first
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        start = time.monotonic()
+        entry = (priority, next(self._order))
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._waiting[0] != entry:
+                    # Woken up when the head of the queue takes its token
+                    self._condition.wait()
+                    continue
+                if now < self.paused_until:
+                    self._condition.wait(self.paused_until - now)
+                elif self.tokens < 1:
+                    self._condition.wait((1 - self.tokens) / self.rate)
+                else:
+                    self.tokens -= 1
+                    heapq.heappop(self._waiting)
+                    self._condition.notify_all()
+                    return time.monotonic() - start
+
+    def throttle(self, retry_after: float):
+        """Pause host after 429 response and halve the rate
+
+        Args:
+            retry_after (float): Seconds to wait before next request
+        """
+        with self._condition:
+            self.rate_limited += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self.rate = max(self.configured_rate * MIN_RATE_RATIO, self.rate / 2)
+            self.tokens = 0.0
+            self._condition.notify_all()
+
+    def recover(self):
+        """Grow rate back to the configured one after successful request"""
+        with self._condition:
+            self.rate = min(
+                self.configured_rate,
+                self.rate + self.configured_rate * RATE_RECOVERY_RATIO,
+            )
+
+
+class RequestScheduler:
+    """Token buckets of all hosts and priority of requests sent by current thread"""
+
+    _buckets = {}
+    _buckets_lock = threading.Lock()
+    _local = threading.local()
+
+    @staticmethod
+    def bucket(host: str) -> TokenBucket:
+        """Get token bucket of host
+
+        Args:
+            host (str): Host name
+
+        Returns:
+            TokenBucket: Bucket shared by all threads
+        """
+        with RequestScheduler._buckets_lock:
+            bucket = RequestScheduler._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(*HOST_RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT))
+                RequestScheduler._buckets[host] = bucket
+            return bucket
+
+    @staticmethod
+    def current_priority() -> RequestPriority:
+        """Priority of requests sent by current thread
+
+        Returns:
+            RequestPriority: INTERACTIVE unless set by priority()
+        """
+        return getattr(RequestScheduler._local, "priority", RequestPriority.INTERACTIVE)
+
+    @staticmethod
+    @contextmanager
+    def priority(priority: RequestPriority):
+        """Send requests of current thread with given priority inside the block
+
+        Args:
+            priority (RequestPriority): Priority of requests
+        """
+        previous = RequestScheduler.current_priority()
+        RequestScheduler._local.priority = priority
+        try:
+            yield
+        finally:
+            RequestScheduler._local.priority = previous
+
+    @staticmethod
+    def acquire(host: str) -> float:
+        """Wait for a token of host with current thread priority
+
+        Args:
+            host (str): Host name
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        return RequestScheduler.bucket(host).acquire(
+            RequestScheduler.current_priority()
+        )
+
+    @staticmethod
+    def stats() -> dict:
+        """Current rate and number of 429 responses per host
+
+        Returns:
+            dict: {host: {"rate": value, "rate_limited": value}}
+        """
+        with RequestScheduler._buckets_lock:
+            buckets = dict(RequestScheduler._buckets)
+        return {
+            host: {"rate": round(bucket.rate, 2), "rate_limited": bucket.rate_limited}
+            for host, bucket in buckets.items()
+        }
@@ -0,0 +1,193 @@
+"""To handle cache of forecast API responses
+
+Forecasts change only when a new model run is published, and archive data never
+changes, so responses are kept in a bounded memory tier backed by SQLite file.
+"""
+import atexit
+import datetime
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+RESPONSE_CACHE_FILE = "response_cache.sqlite"
+MEMORY_MAX_ENTRIES = 256
+DISK_MAX_ENTRIES = 5000
+# Open-Meteo publishes updated forecasts every hour - entries expire at the next full hour
+FORECAST_UPDATE_INTERVAL = 3600
+# Time to live in seconds per host, None - entries never expire
+ENDPOINT_TTL = {
+    "api.open-meteo.com": FORECAST_UPDATE_INTERVAL,
+    "archive-api.open-meteo.com": None,
+}
+# Archive for the last days is still being filled in, so it is cached like forecast
+ARCHIVE_FINAL_AFTER_DAYS = 7
+COORDINATES_PRECISION = 2
+LIST_PARAMETERS = ("hourly", "daily")
+
+
+class ResponseCache:
+    """Two tier (memory + SQLite) cache of API responses with per endpoint TTL"""
+
+    def __init__(
+        self,
+        path: str = RESPONSE_CACHE_FILE,
+        memory_max_entries: int = MEMORY_MAX_ENTRIES,
+        disk_max_entries: int = DISK_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_entries = disk_max_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._connection = None
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @staticmethod
+    def normalize_key(url: str) -> str:
+        """Build cache key independent of parameters order and coordinates noise
+
+        Args:
+            url (str): Url for api call
+
+        Returns:
+            str: Normalized key
+        """
+        parts = urlsplit(url)
+        parameters = []
+        for name, value in parse_qsl(parts.query):
+            if name in ("latitude", "longitude"):
+                value = ",".join(
+                    f"{float(item):.{COORDINATES_PRECISION}f}" for item in value.split(",")
+                )
+            elif name in LIST_PARAMETERS:
+                value = ",".join(sorted(value.split(",")))
+            parameters.append((name, value))
+        return f"{parts.netloc}{parts.path}?{urlencode(sorted(parameters))}"
+
+    @staticmethod
+    def _expires_at(url: str, now: float) -> float:
+        """Calculate expiry time aligned to the model update cycle
+
+        Args:
+            url (str): Url for api call
+            now (float): Current timestamp
+
+        Returns:
+            float: Expiry timestamp, math.inf if response never expires
+        """
+        parts = urlsplit(url)
+        ttl = ENDPOINT_TTL.get(parts.netloc, FORECAST_UPDATE_INTERVAL)
+        if ttl is None:
+            end_date = dict(parse_qsl(parts.query)).get("end_date")
+            recent = datetime.date.today() - datetime.timedelta(
+                days=ARCHIVE_FINAL_AFTER_DAYS
+            )
+            if end_date is None or datetime.date.fromisoformat(end_date) < recent:
+                return math.inf
+            ttl = FORECAST_UPDATE_INTERVAL
+        return (now // ttl + 1) * ttl
+
+    def _open(self):
+        """Open SQLite file for disk tier"""
+        if self._connection is not None:
+            return
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, expires REAL, body TEXT, last_used REAL)"
+        )
+        self._connection.execute(
+            "DELETE FROM responses WHERE expires < ?", (time.time(),)
+        )
+        self._connection.commit()
+        atexit.register(self._connection.close)
+
+    def _remember(self, key: str, expires: float, response):
+        """Put entry into memory tier and drop least recently used above the limit"""
+        self._memory[key] = (expires, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, url: str):
+        """Get cached response
+
+        Args:
+            url (str): Url for api call
+
+        Returns:
+            json: Cached response or None if not cached or expired
+        """
+        key = self.normalize_key(url)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[1]
+
+            self._open()
+            row = self._connection.execute(
+                "SELECT expires, body FROM responses WHERE key = ? AND expires > ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            self._connection.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self._connection.commit()
+            response = json.loads(row[1])
+            self._remember(key, row[0], response)
+            self.counters["disk_hits"] += 1
+            return response
+
+    def put(self, url: str, response):
+        """Store response in both tiers
+
+        Args:
+            url (str): Url for api call
+            response (json): API response
+        """
+        key = self.normalize_key(url)
+        now = time.time()
+        expires = self._expires_at(url, now)
+        with self._lock:
+            self._remember(key, expires, response)
+            self._open()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, expires, json.dumps(response), now),
+            )
+            overflow = (
+                self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                - self.disk_max_entries
+            )
+            if overflow > 0:
+                self._connection.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                logging.debug("Response cache: evicted %s entries", overflow)
+            self._connection.commit()
+
+    def stats(self) -> dict:
+        """Hit and miss counters
+
+        Returns:
+            dict: Counters with hit ratio
+        """
+        with self._lock:
+            stats = dict(self.counters)
+        requests = sum(stats.values())
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_ratio"] = round(hits / requests, 3) if requests else 0.0
+        return stats
@@ -0,0 +1,257 @@
+"""Long-running HTTP JSON service exposing the forecast options
+
+Modules, connection pools and caches stay warm between queries, and identical
+upstream requests sent at the same time by many clients are coalesced into one
+API call. Run e.g.:
+
+    python service.py --port 8000
+
+Endpoints:
+    GET  /forecast?city=Wroclaw&street=Fabryczna&days=5         - option 1
+    GET  /climatology?city=Wroclaw&street=Fabryczna&days=5&years=4 - option 2
+    POST /trip (CSV with City, Street, Date columns as body)    - option 3
+    GET  /metrics
+"""
+import argparse
+import io
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import pandas as pd
+import main
+from api_requests import ApiRequests
+from forecast import ArchiveUnavailableError, CityForecast, ForecastUnavailableError
+from localization import CityLocalization
+from logging_settings import set_logger
+from metrics import Metrics
+from request_scheduler import RequestScheduler
+from trip_pipeline import TripPipeline, MAX_WORKERS
+
+HOST = "127.0.0.1"
+PORT = 8000
+MAX_FORECAST_DAYS = 16
+
+
+class ServiceError(Exception):
+    """Error returned to client with HTTP status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def values_to_json(values: np.ndarray) -> list:
+    """Values rounded to 2 decimals with missing values as null
+
+    Args:
+        values (np.ndarray): float32 values
+
+    Returns:
+        list: JSON serializable list
+    """
+    rounded = np.round(values.astype(np.float64), 2)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+
+def block_to_json(block) -> dict:
+    """Time series block as JSON object
+
+    Args:
+        block (TimeSeriesBlock): Time series
+
+    Returns:
+        dict: {"times": [...], "series": {label: [...]}}
+    """
+    return {
+        "times": np.datetime_as_string(block.times).tolist(),
+        "series": {
+            label: values_to_json(values)
+            for label, values in zip(block.labels, block.values)
+        },
+    }
+
+
+class WeatherService:
+    """Endpoint handlers - take query parameters and return JSON serializable result"""
+
+    @staticmethod
+    def _location(params: dict) -> dict:
+        """Geocode city and street from query parameters
+
+        Args:
+            params (dict): Query parameters
+
+        Raises:
+            ServiceError: Location could not be geocoded
+
+        Returns:
+            dict: Coordinates of the location
+        """
+        city = params.get("city", "Wroclaw")
+        street = params.get("street", "Fabryczna")
+        try:
+            return CityLocalization(city, street).get_coordinates_from_response()
+        except SystemExit as error:
+            raise ServiceError(502, f"Location not found: {city}, {street}") from error
+
+    @staticmethod
+    def _days(params: dict) -> str:
+        """Number of forecast days from query parameters
+
+        Args:
+            params (dict): Query parameters
+
+        Raises:
+            ServiceError: Days out of range
+
+        Returns:
+            str: Number of days
+        """
+        days = params.get("days", "5")
+        if not days.isdigit() or not 0 < int(days) <= MAX_FORECAST_DAYS:
+            raise ServiceError(400, f"days must be from 1 to {MAX_FORECAST_DAYS}")
+        return days
+
+    @staticmethod
+    def forecast(params: dict, _body: bytes) -> dict:
+        """Option 1 - hourly forecast of all forecast types"""
+        days = WeatherService._days(params)
+        coords_dict = WeatherService._location(params)
+        with Metrics.stage("service.forecast"):
+            block = main.build_forecast_time_series(days, coords_dict)
+        return {"coordinates": coords_dict, **block_to_json(block)}
+
+    @staticmethod
+    def climatology(params: dict, _body: bytes) -> dict:
+        """Option 2 - temperature forecast compared with climatology of last years"""
+        days = WeatherService._days(params)
+        years = params.get("years", "4")
+        if not years.isdigit() or int(years) < 1:
+            raise ServiceError(400, "years must be positive number")
+        coords_dict = WeatherService._location(params)
+        with Metrics.stage("service.climatology"):
+            forecast, bands, ranks = main.build_climatology_comparison(
+                days, coords_dict, int(years)
+            )
+        return {
+            "coordinates": coords_dict,
+            "forecast": block_to_json(forecast),
+            "bands": block_to_json(bands)["series"],
+            "percentile": values_to_json(ranks),
+        }
+
+    @staticmethod
+    def trip(params: dict, body: bytes) -> str:
+        """Option 3 - trip rows from CSV body enriched with forecasts"""
+        try:
+            trip_data = pd.read_csv(io.BytesIO(body))
+        except (pd.errors.EmptyDataError, pd.errors.ParserError) as error:
+            raise ServiceError(400, f"Invalid CSV: {error}") from error
+        max_workers = int(params.get("max_workers", MAX_WORKERS))
+        with Metrics.stage("service.trip"):
+            enriched = TripPipeline(max_workers).enrich(trip_data)
+        # Already serialized by pandas
+        return enriched.to_json(orient="records", double_precision=6)
+
+    @staticmethod
+    def metrics(_params: dict, _body: bytes) -> dict:
+        """Metrics of the running service together with cache statistics"""
+        return dict(
+            Metrics.summary(),
+            response_cache=CityForecast.cache.stats(),
+            geocode_cache=CityLocalization.cache.stats(),
+            single_flight=ApiRequests.flight.stats(),
+            scheduler=RequestScheduler.stats(),
+        )
+
+
+ROUTES = {
+    ("GET", "/forecast"): WeatherService.forecast,
+    ("GET", "/climatology"): WeatherService.climatology,
+    ("POST", "/trip"): WeatherService.trip,
+    ("GET", "/metrics"): WeatherService.metrics,
+}
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """Dispatch requests to WeatherService endpoints"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        """Run endpoint handler and send its result as JSON
+
+        Args:
+            method (str): HTTP method
+        """
+        parts = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        handler = ROUTES.get((method, parts.path))
+        try:
+            if handler is None:
+                raise ServiceError(404, f"Unknown endpoint: {method} {parts.path}")
+            result = handler(params, body)
+            status = 200
+        except ServiceError as error:
+            result, status = {"error": str(error)}, error.status
+        except ValueError as error:
+            result, status = {"error": str(error)}, 400
+        except (SystemExit, ForecastUnavailableError, ArchiveUnavailableError) as error:
+            # Upstream failures end the CLI app - the service reports them instead
+            result, status = {"error": f"Upstream error: {error}"}, 502
+        except Exception as error:  # pylint: disable=broad-except
+            logging.exception("Error: Request %s %s failed", method, self.path)
+            result, status = {"error": f"Internal error: {error}"}, 500
+        payload = result if isinstance(result, str) else json.dumps(result)
+        self._send_json(status, payload.encode("utf-8"))
+
+    def _send_json(self, status: int, payload: bytes):
+        """Send JSON response
+
+        Args:
+            status (int): HTTP status
+            payload (bytes): Encoded JSON
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logging.info("INFO: service %s - %s", self.address_string(), format % args)
+
+
+def main_service(argv: list = None):
+    """Parse command line arguments and serve until interrupted"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--log-json", action="store_true", help="JSON lines log file")
+    args = parser.parse_args(argv)
+
+    set_logger(json_lines=args.log_json or None)
+    server = ThreadingHTTPServer((args.host, args.port), ServiceRequestHandler)
+    server.daemon_threads = True
+    logging.info("INFO: Service listening on http://%s:%s", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("INFO: Service stopped")
+    finally:
+        server.server_close()
+        main.dump_metrics()
+
+
+if __name__ == "__main__":
+    main_service()
@@ -0,0 +1,95 @@
+"""To handle coalescing of identical in-flight calls
+
+When many threads ask for the same key at the same time, only the first one runs
+the call and the others wait for its result. Results are not kept after the call
+finishes - caching is left to the caches.
+"""
+import threading
+
+
+class _Call:
+    """One in-flight call shared by waiting threads"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: str, function, *args):
+        """Run function or wait for the identical call already in flight
+
+        Args:
+            key (str): Key identifying identical calls, e.g. url
+            function (callable): Function to run
+            *args: Arguments of the function
+
+        Raises:
+            BaseException: Error raised by the shared call
+
+        Returns:
+            Any: Result of the call - shared by all callers, must not be modified
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args)
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        """Coalescing statistics
+
+        Returns:
+            dict: Number of executed and shared calls
+        """
+        with self._lock:
+            return {"executed": self.executed, "shared": self.shared}
+
+
+class KeyedLocks:
+    """One lock per key, e.g. per file - threads working on the same key run one by one"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def lock(self, key: str) -> threading.Lock:
+        """Lock assigned to key
+
+        Args:
+            key (str): Key, e.g. path of the file
+
+        Returns:
+            threading.Lock: Lock shared by all callers with the same key
+        """
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
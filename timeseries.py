@@ -0,0 +1,77 @@
+"""To handle compact hourly time series
+
+Values of many variables or years are kept in one float32 block with one row per
+series. Timestamps are not stored - they are computed from start and step.
+"""
+import numpy as np
+
+HOUR = np.timedelta64(1, "h")
+
+
+class TimeSeriesBlock:
+    """Aligned time series - start, step, labels and float32 block (series x steps)"""
+
+    def __init__(
+        self,
+        start: np.datetime64,
+        labels: list,
+        values: np.ndarray,
+        step: np.timedelta64 = HOUR,
+    ):
+        self.start = np.datetime64(start, "h")
+        self.step = step
+        self.labels = [str(label) for label in labels]
+        self.values = np.atleast_2d(np.asarray(values, dtype=np.float32))
+
+    @classmethod
+    def from_hourly_response(cls, hourly: dict, variables: list) -> "TimeSeriesBlock":
+        """Build block from "hourly" part of Open-Meteo response
+
+        Args:
+            hourly (dict): {"time": [...], variable: [...]}
+            variables (list): Variables to keep
+
+        Returns:
+            TimeSeriesBlock: One row per variable
+        """
+        values = np.empty((len(variables), len(hourly["time"])), dtype=np.float32)
+        for row, variable in enumerate(variables):
+            # None (missing value) is converted to NaN
+            values[row] = np.array(hourly[variable], dtype=np.float32)
+        start = np.datetime64(hourly["time"][0], "m") if hourly["time"] else "NaT"
+        return cls(start, variables, values)
+
+    @property
+    def times(self) -> np.ndarray:
+        """Timestamps of columns
+
+        Returns:
+            np.ndarray: datetime64[h] array
+        """
+        return self.start + np.arange(self.values.shape[1]) * self.step
+
+    def view(self, label: str) -> np.ndarray:
+        """Values of one series without copying
+
+        Args:
+            label (str): Series label
+
+        Returns:
+            np.ndarray: View of the block row
+        """
+        return self.values[self.labels.index(str(label))]
+
+    def to_frame(self):
+        """Pandas DataFrame indexed by time, one column per series
+
+        Returns:
+            pd.DataFrame: Frame built on the block values
+        """
+        import pandas as pd
+
+        return pd.DataFrame(
+            self.values.T, index=pd.DatetimeIndex(self.times), columns=self.labels
+        )
+
+    def __len__(self) -> int:
+        return self.values.shape[1]
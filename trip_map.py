@@ -0,0 +1,142 @@
+"""To handle preparing markers and map of the trip
+
+Small trips get one folium marker per place. Large trips are rendered as a single
+clustered layer - places are sent as a compact data array and popups are built
+in the browser only when clicked.
+"""
+import json
+import numpy as np
+import pandas as pd
+
+# Trip dataframe columns shown in marker popup
+POPUP_COLUMNS = [
+    "City",
+    "Date",
+    "Wheatercode",
+    "Temp_max",
+    "Temp_min",
+    "Rain_sum",
+    "Shower_sum",
+    "Wind_speed_max",
+]
+# Above this number of places the map is rendered as clustered layer
+MARKERS_LIMIT = 200
+MAP_MODES = ("markers", "cluster")
+
+# Leaflet callback for FastMarkerCluster - row is [lat, lon, number, color, *popup values]
+CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 8, color: row[3], fillOpacity: 0.7
+    });
+    marker.bindTooltip(String(row[2]));
+    marker.bindPopup(function () {
+        var names = %s;
+        var lines = [];
+        for (var i = 0; i < names.length; i++) {
+            lines.push(names[i] + ": " + row[i + 4]);
+        }
+        return lines.join("<br>");
+    });
+    return marker;
+}
+"""
+
+
+def prepare_markers(trip_data: pd.DataFrame) -> pd.DataFrame:
+    """Compute marker color, number and popup text for all trip places at once
+
+    Args:
+        trip_data (pd.DataFrame): Trip details enriched by TripPipeline
+
+    Returns:
+        pd.DataFrame: Columns Latitude, Longitude, Number, Color, Popup
+    """
+    # Red marker if rain or shower is expected
+    rainy = (trip_data["Rain_sum"].to_numpy() > 0) | (
+        trip_data["Shower_sum"].to_numpy() > 0
+    )
+    popup = pd.Series("", index=trip_data.index)
+    for column in POPUP_COLUMNS:
+        popup = popup + f"{column}: " + trip_data[column].astype(str) + "<br>"
+    return pd.DataFrame(
+        {
+            "Latitude": trip_data["Latitude"].to_numpy(),
+            "Longitude": trip_data["Longitude"].to_numpy(),
+            "Number": np.arange(1, len(trip_data) + 1),
+            "Color": np.where(rainy, "red", "blue"),
+            "Popup": popup.to_numpy(),
+        }
+    )
+
+
+def build_trip_map(trip_data: pd.DataFrame, mode: str = None):
+    """Build folium map with trip places
+
+    Args:
+        trip_data (pd.DataFrame): Trip details enriched by TripPipeline
+        mode (str): One of MAP_MODES, chosen by number of places if None
+
+    Returns:
+        folium.Map: Map with markers
+    """
+    import folium
+
+    # Places which were not geocoded have no marker
+    trip_data = trip_data.dropna(subset=["Latitude", "Longitude"])
+    if mode is None:
+        mode = "markers" if len(trip_data) <= MARKERS_LIMIT else "cluster"
+    # Map is centered between the first and the last place of the trip
+    latitudes = trip_data["Latitude"].to_numpy()
+    longitudes = trip_data["Longitude"].to_numpy()
+    center = [(latitudes[0] + latitudes[-1]) / 2, (longitudes[0] + longitudes[-1]) / 2]
+    folium_map = folium.Map(location=center, zoom_start=7)
+    if mode == "cluster":
+        _add_cluster_layer(folium_map, trip_data)
+        return folium_map
+
+    markers = prepare_markers(trip_data)
+    for lat, lon, number, color, popup in markers.itertuples(index=False):
+        folium.Marker(
+            [lat, lon],
+            radius=10,
+            popup=popup,
+            icon=folium.Icon(icon=str(number), prefix="fa", color=color),
+        ).add_to(folium_map)
+    return folium_map
+
+
+def _add_cluster_layer(folium_map, trip_data: pd.DataFrame):
+    """Add all trip places to map as one FastMarkerCluster layer
+
+    Args:
+        folium_map (folium.Map): Map to update
+        trip_data (pd.DataFrame): Trip details enriched by TripPipeline
+    """
+    from folium.plugins import FastMarkerCluster
+
+    rainy = (trip_data["Rain_sum"].to_numpy() > 0) | (
+        trip_data["Shower_sum"].to_numpy() > 0
+    )
+    layer_columns = [
+        trip_data["Latitude"].to_numpy().tolist(),
+        trip_data["Longitude"].to_numpy().tolist(),
+        list(range(1, len(trip_data) + 1)),
+        np.where(rainy, "red", "blue").tolist(),
+    ] + [trip_data[column].astype(str).tolist() for column in POPUP_COLUMNS]
+    FastMarkerCluster(
+        data=[list(row) for row in zip(*layer_columns)],
+        callback=CLUSTER_CALLBACK % json.dumps(POPUP_COLUMNS),
+    ).add_to(folium_map)
+
+
+def render_html(folium_map) -> str:
+    """Render map as standalone HTML document in memory
+
+    Args:
+        folium_map (folium.Map): Map to render
+
+    Returns:
+        str: HTML document
+    """
+    return folium_map.get_root().render()
@@ -0,0 +1,269 @@
+"""To handle fetching coordinates and forecasts for all places of the trip"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from enums import RequestPriority
+from localization import CityLocalization, LocalizationNotFoundError
+from metrics import Metrics
+from request_scheduler import RequestScheduler
+from response_cache import FORECAST_UPDATE_INTERVAL
+from trip_planner import TripRequestPlanner
+
+MAX_WORKERS = 8
+# Trip dataframe column -> daily forecast feature
+FORECAST_COLUMNS = {
+    "Wheatercode": "weathercode",
+    "Temp_max": "temperature_2m_max",
+    "Temp_min": "temperature_2m_min",
+    "Rain_sum": "rain_sum",
+    "Shower_sum": "showers_sum",
+    "Wind_speed_max": "windspeed_10m_max",
+}
+TRIP_RESULTS_FILE = "route_forecast.csv"
+# Rows with the same key are the same stop of the trip
+TRIP_KEY_COLUMNS = ["City", "Street", "Date"]
+FETCHED_AT_COLUMN = "Fetched_at"
+RESULT_COLUMNS = ["Latitude", "Longitude", *FORECAST_COLUMNS]
+# Result columns which are not float32 measurements - weather code stays integer
+RESULT_DTYPES = {
+    "Latitude": np.float64,
+    "Longitude": np.float64,
+    "Wheatercode": "Int16",
+}
+
+
+def result_column(values, column: str) -> pd.api.extensions.ExtensionArray:
+    """Values converted to dtype of result column, missing values are kept
+
+    Args:
+        values (array-like): Values of the column
+        column (str): Name of result column
+
+    Returns:
+        pd.api.extensions.ExtensionArray: Values ready to assign to trip dataframe
+    """
+    return pd.Series(values).astype(RESULT_DTYPES.get(column, np.float32)).array
+
+
+def load_trip_results(path: str = TRIP_RESULTS_FILE) -> pd.DataFrame:
+    """Enriched trip saved by previous run
+
+    Args:
+        path (str): CSV file
+
+    Returns:
+        pd.DataFrame: Previous result or None if there is no valid one
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        previous = pd.read_csv(path)
+    except (pd.errors.EmptyDataError, pd.errors.ParserError):
+        logging.info("Info: Previous trip result %s can not be read \n", path)
+        return None
+    required = [*TRIP_KEY_COLUMNS, *RESULT_COLUMNS, FETCHED_AT_COLUMN]
+    return previous if set(required).issubset(previous.columns) else None
+
+
+def save_trip_results(trip_data: pd.DataFrame, path: str = TRIP_RESULTS_FILE):
+    """Save enriched trip for the next run
+
+    Args:
+        trip_data (pd.DataFrame): Trip enriched by TripPipeline.enrich_incremental
+        path (str): CSV file
+    """
+    trip_data.to_csv(path, index=False)
+
+
+class TripPipeline:
+    """Fetch coordinates and detailed forecasts for trip places concurrently.
+    Forecasts are fetched with the fewest calls planned by TripRequestPlanner.
+    Requests are sent with BATCH priority, so interactive queries go first"""
+
+    def __init__(
+        self,
+        max_workers: int = MAX_WORKERS,
+        planner: TripRequestPlanner = None,
+        priority: RequestPriority = RequestPriority.BATCH,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.planner = planner or TripRequestPlanner()
+        self.priority = priority
+
+    def _with_priority(self, function):
+        """Wrap function to send its requests with pipeline priority from worker threads
+
+        Args:
+            function (callable): Function of one argument
+
+        Returns:
+            callable: Wrapped function
+        """
+
+        def run(item):
+            with RequestScheduler.priority(self.priority):
+                return function(item)
+
+        return run
+
+    @staticmethod
+    def _geocode_place(place: tuple) -> dict:
+        """Get coordinates for one place
+
+        Args:
+            place (tuple): (city, street)
+
+        Returns:
+            dict: Dictionary {"lat": value, "lon": value}, None if place was not found
+        """
+        city, street = place
+        try:
+            return CityLocalization(city, street).find_coordinates()
+        except LocalizationNotFoundError:
+            # Rows of the place get no forecast, the rest of the trip is processed
+            logging.info("Error: Localization not found for %s, %s", city, street)
+            Metrics.increment("trip.geocode_failed")
+            return None
+
+    def run(self, places: list) -> list:
+        """Process all places in a bounded thread pool
+
+        Args:
+            places (list): List of tuples (city, street, date)
+
+        Returns:
+            tuple: (coordinates dicts list, {feature: array}) - both in the same order as places,
+                coordinates are None for places which were not found
+        """
+        logging.info(
+            "INFO: Fetching forecasts for %s places with %s parallel requests \n",
+            len(places),
+            self.max_workers,
+        )
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Geocode every unique (city, street) pair once
+            unique_places = list(
+                dict.fromkeys((city, street) for city, street, _ in places)
+            )
+            with Metrics.stage("trip.geocode"):
+                place_coordinates = dict(
+                    zip(
+                        unique_places,
+                        executor.map(
+                            self._with_priority(self._geocode_place), unique_places
+                        ),
+                    )
+                )
+            coordinates = [
+                place_coordinates[(city, street)] for city, street, _ in places
+            ]
+            dates = [date for _, _, date in places]
+
+            requests = self.planner.plan(coordinates, dates)
+            Metrics.increment("trip.rows", len(places))
+            Metrics.increment("trip.forecast_requests", len(requests))
+            with Metrics.stage("trip.forecast"):
+                responses = list(
+                    executor.map(
+                        self._with_priority(
+                            lambda request: request.make_forecast_request()
+                        ),
+                        requests,
+                    )
+                )
+        with Metrics.stage("trip.split"):
+            forecasts = self.planner.split(
+                requests, responses, coordinates, dates, list(FORECAST_COLUMNS.values())
+            )
+        return coordinates, forecasts
+
+    def enrich(self, trip_data: pd.DataFrame) -> pd.DataFrame:
+        """Add coordinates and forecast columns to trip dataframe
+
+        Args:
+            trip_data (pd.DataFrame): Trip details with City, Street and Date columns
+
+        Returns:
+            pd.DataFrame: Trip details with Latitude, Longitude and FORECAST_COLUMNS
+        """
+        places = list(zip(trip_data["City"], trip_data["Street"], trip_data["Date"]))
+        coordinates, forecasts = self.run(places)
+        trip_data["Latitude"] = np.fromiter(
+            (
+                coords_dict["lat"] if coords_dict else np.nan
+                for coords_dict in coordinates
+            ),
+            dtype=np.float64,
+            count=len(coordinates),
+        )
+        trip_data["Longitude"] = np.fromiter(
+            (
+                coords_dict["lon"] if coords_dict else np.nan
+                for coords_dict in coordinates
+            ),
+            dtype=np.float64,
+            count=len(coordinates),
+        )
+        for column, feature in FORECAST_COLUMNS.items():
+            trip_data[column] = result_column(forecasts[feature], column)
+        return trip_data
+
+    def enrich_incremental(
+        self, trip_data: pd.DataFrame, previous: pd.DataFrame = None
+    ) -> pd.DataFrame:
+        """Add coordinates and forecast columns, reusing rows of previous result.
+        Row is fetched again if it is new or changed, or if its forecast may have been
+        updated - it was fetched earlier than FORECAST_UPDATE_INTERVAL ago and before
+        its day ended
+
+        Args:
+            trip_data (pd.DataFrame): Trip details with City, Street and Date columns
+            previous (pd.DataFrame): Result of previous run with Fetched_at column
+
+        Returns:
+            pd.DataFrame: Trip details with Latitude, Longitude, FORECAST_COLUMNS and Fetched_at
+        """
+        now = pd.Timestamp.now().floor("s")
+        if previous is None:
+            previous = pd.DataFrame(
+                columns=[*TRIP_KEY_COLUMNS, *RESULT_COLUMNS, FETCHED_AT_COLUMN]
+            )
+        previous = previous.astype({column: str for column in TRIP_KEY_COLUMNS})
+        previous = previous.drop_duplicates(TRIP_KEY_COLUMNS, keep="last")
+        keys = trip_data[TRIP_KEY_COLUMNS].astype(str)
+        matched = keys.merge(
+            previous[[*TRIP_KEY_COLUMNS, *RESULT_COLUMNS, FETCHED_AT_COLUMN]],
+            on=TRIP_KEY_COLUMNS,
+            how="left",
+        )
+
+        fetched_at = pd.to_datetime(matched[FETCHED_AT_COLUMN], errors="coerce")
+        day_end = pd.to_datetime(keys["Date"], errors="coerce").reset_index(
+            drop=True
+        ) + pd.Timedelta(days=1)
+        reusable = (
+            (fetched_at >= now - pd.Timedelta(seconds=FORECAST_UPDATE_INTERVAL))
+            | (fetched_at >= day_end)
+        ).to_numpy()
+        logging.info(
+            "INFO: %s of %s trip rows reused from previous result \n",
+            int(reusable.sum()),
+            len(trip_data),
+        )
+        Metrics.increment("trip.rows_reused", int(reusable.sum()))
+
+        for column in RESULT_COLUMNS:
+            trip_data[column] = result_column(matched[column], column)
+        trip_data[FETCHED_AT_COLUMN] = matched[FETCHED_AT_COLUMN].to_numpy(dtype=object)
+        if not reusable.all():
+            fetched = self.enrich(trip_data.loc[~reusable, TRIP_KEY_COLUMNS].copy())
+            for column in RESULT_COLUMNS:
+                trip_data.loc[~reusable, column] = fetched[column].array
+            # Rows without forecast stay stale, so they are requested again next run
+            received = fetched[list(FORECAST_COLUMNS)].notna().any(axis=1).to_numpy()
+            trip_data.loc[~reusable, FETCHED_AT_COLUMN] = np.where(
+                received, now.isoformat(), None
+            )
+        return trip_data
@@ -0,0 +1,176 @@
+"""To plan the fewest forecast API calls for trip places
+
+Open-Meteo accepts comma separated coordinates lists and date ranges, so trip
+rows sharing location or near in time can be fetched with one API call.
+"""
+import datetime
+import logging
+import numpy as np
+from forecast import MultiLocationForecast
+from grid_index import FORECAST_GRID, GridIndex
+from metrics import Metrics
+
+# Forecast API serves at most 16 days, so one request can not span more
+MAX_WINDOW_DAYS = 16
+# Forecast API rejects the whole request if any date is outside of
+# [today - PAST_DAYS_LIMIT, today + FORECAST_DAYS_LIMIT - 1]
+PAST_DAYS_LIMIT = 92
+FORECAST_DAYS_LIMIT = 16
+# Limit of locations in one request to keep URL short
+MAX_LOCATIONS_PER_REQUEST = 50
+
+
+class TripRequestPlanner:
+    """Group trip rows by model grid cell and date window into multi-location requests"""
+
+    def __init__(
+        self,
+        max_window_days: int = MAX_WINDOW_DAYS,
+        max_locations: int = MAX_LOCATIONS_PER_REQUEST,
+        grid: GridIndex = FORECAST_GRID,
+    ):
+        self.max_window_days = max_window_days
+        self.max_locations = max_locations
+        self.grid = grid
+
+    def _location_key(self, coords_dict: dict) -> tuple:
+        return self.grid.cell(coords_dict)
+
+    def plan(self, coordinates: list, dates: list) -> list:
+        """Build list of requests covering all rows
+
+        Args:
+            coordinates (list): Coordinates dict for every row, rows with None are skipped
+            dates (list): Date in format YYYY-MM-DD for every row, rows out of
+                forecast API range are skipped
+
+        Returns:
+            list: List of MultiLocationForecast requests
+        """
+        today = datetime.date.today()
+        first_day = today - datetime.timedelta(days=PAST_DAYS_LIMIT)
+        last_day = today + datetime.timedelta(days=FORECAST_DAYS_LIMIT - 1)
+        # Dates needed for every unique location
+        location_dates = {}
+        out_of_range = 0
+        for coords_dict, date in zip(coordinates, dates):
+            if coords_dict is None:
+                continue
+            day = datetime.date.fromisoformat(str(date))
+            if not first_day <= day <= last_day:
+                out_of_range += 1
+                continue
+            location_dates.setdefault(self._location_key(coords_dict), set()).add(day)
+        if out_of_range:
+            logging.info(
+                "Error: %s trip rows out of forecast range %s - %s are skipped",
+                out_of_range,
+                first_day,
+                last_day,
+            )
+            Metrics.increment("trip.rows_out_of_range", out_of_range)
+
+        # Split dates of every location into windows not longer than max_window_days
+        windows = []
+        for location, days in location_dates.items():
+            days = sorted(days)
+            window_start = days[0]
+            for previous, day in zip(days, days[1:]):
+                if (day - window_start).days >= self.max_window_days:
+                    windows.append((window_start, previous, location))
+                    window_start = day
+            windows.append((window_start, days[-1], location))
+
+        # Merge windows of different locations while the joined span fits into limits
+        windows.sort()
+        requests = []
+        batch = []
+        batch_start = batch_end = None
+        for start, end, location in windows:
+            if batch and (
+                len(batch) == self.max_locations
+                or (max(batch_end, end) - batch_start).days >= self.max_window_days
+            ):
+                requests.append(self._build_request(batch, batch_start, batch_end))
+                batch = []
+            if not batch:
+                batch_start, batch_end = start, end
+            batch_end = max(batch_end, end)
+            batch.append(location)
+        if batch:
+            requests.append(self._build_request(batch, batch_start, batch_end))
+
+        logging.info(
+            "INFO: %s trip rows in %s grid cells planned as %s API calls - %s calls saved \n",
+            len(dates),
+            len(location_dates),
+            len(requests),
+            len(dates) - len(requests),
+        )
+        return requests
+
+    @staticmethod
+    def _build_request(
+        locations: list, start: datetime.date, end: datetime.date
+    ) -> MultiLocationForecast:
+        coordinates_list = [{"lat": lat, "lon": lon} for lat, lon in locations]
+        return MultiLocationForecast(
+            coordinates_list, start.isoformat(), end.isoformat()
+        )
+
+    def split(
+        self,
+        requests: list,
+        responses: list,
+        coordinates: list,
+        dates: list,
+        features: list,
+    ) -> dict:
+        """Split responses of planned requests back to rows as typed columns
+
+        Args:
+            requests (list): Requests returned by plan()
+            responses (list): Response of every request - list with item per location
+            coordinates (list): Coordinates dict for every row, None if not geocoded
+            dates (list): Date in format YYYY-MM-DD for every row
+            features (list): Daily forecast features to extract
+
+        Returns:
+            dict: {feature: float32 array with value for every row, NaN if not fetched}
+        """
+        # All fetched days are concatenated into flat arrays, (location, date) -> position
+        positions = {}
+        offset = 0
+        fetched = {feature: [] for feature in features}
+        for request, response in zip(requests, responses):
+            locations = zip(request.latitude.split(","), request.longitude.split(","))
+            for (lat, lon), location_response in zip(locations, response or []):
+                daily = (location_response or {}).get("daily")
+                if not daily:
+                    continue
+                location = (float(lat), float(lon))
+                for index, day in enumerate(daily["time"]):
+                    positions[(location, day)] = offset + index
+                offset += len(daily["time"])
+                for feature in features:
+                    fetched[feature].append(np.array(daily[feature], dtype=np.float32))
+
+        row_positions = np.fromiter(
+            (
+                (
+                    positions.get((self._location_key(coords_dict), str(date)), -1)
+                    if coords_dict is not None
+                    else -1
+                )
+                for coords_dict, date in zip(coordinates, dates)
+            ),
+            dtype=np.int64,
+            count=len(dates),
+        )
+        missing = row_positions < 0
+        columns = {}
+        for feature in features:
+            values = np.concatenate(fetched[feature] + [np.array([np.nan], np.float32)])
+            # Missing rows point to the trailing NaN
+            columns[feature] = values[np.where(missing, -1, row_positions)]
+        return columns
@@ -1,12 +1,18 @@
 """ pyQT windows to show folium map"""
+import os
+import tempfile
+from PyQt6.QtCore import QUrl
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QMainWindow
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 
+# QWebEngineView.setHtml can not display content larger than 2 MB
+SET_HTML_LIMIT = 2 * 1024 * 1024
+
 
 class MainWindow(QMainWindow):
     """To build Qt Window"""
 
-    def __init__(self):
+    def __init__(self, html: str):
         super().__init__()
 
         self.setWindowTitle("Trip weather forecast")
@@ -21,4 +27,20 @@ class MainWindow(QMainWindow):
         view = QWebEngineView()
         layout.addWidget(view)
 
-        view.setHtml(open("map.html").read())
+        self._html_path = None
+        if len(html.encode()) < SET_HTML_LIMIT:
+            view.setHtml(html)
+        else:
+            # Too big for setHtml - load from temporary file removed with the window
+            with tempfile.NamedTemporaryFile(
+                "w", suffix=".html", encoding="utf-8", delete=False
+            ) as html_file:
+                html_file.write(html)
+            self._html_path = html_file.name
+            view.setUrl(QUrl.fromLocalFile(self._html_path))
+
+    def closeEvent(self, event):
+        """Remove temporary map file when window is closed"""
+        if self._html_path is not None and os.path.exists(self._html_path):
+            os.remove(self._html_path)
+        super().closeEvent(event)